@@ -0,0 +1,35 @@
+"""add embedding cache
+
+Revision ID: 0003_embedding_cache
+Revises: 0002_repo_status
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+revision = "0003_embedding_cache"
+down_revision = "0002_repo_status"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "embedding_cache",
+        sa.Column("model", sa.String(), primary_key=True),
+        sa.Column("dim", sa.Integer(), primary_key=True),
+        sa.Column("content_hash", sa.String(length=64), primary_key=True),
+        sa.Column("embedding", Vector(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_embedding_cache_last_used_at", "embedding_cache", ["last_used_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_embedding_cache_last_used_at", table_name="embedding_cache")
+    op.drop_table("embedding_cache")
@@ -0,0 +1,40 @@
+"""add repo file manifest
+
+Revision ID: 0004_repo_files
+Revises: 0003_embedding_cache
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0004_repo_files"
+down_revision = "0003_embedding_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "repo_files",
+        sa.Column("repo_id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("path", sa.String(), primary_key=True),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column(
+            "chunk_ids",
+            postgresql.ARRAY(postgresql.UUID(as_uuid=True)),
+            nullable=False,
+            server_default="{}",
+        ),
+        sa.Column(
+            "indexed_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ),
+        sa.ForeignKeyConstraint(["repo_id"], ["repos.id"], ondelete="CASCADE"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("repo_files")
@@ -0,0 +1,57 @@
+"""add index jobs
+
+Revision ID: 0005_index_jobs
+Revises: 0004_repo_files
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0005_index_jobs"
+down_revision = "0004_repo_files"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "index_jobs",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("repo_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("status", sa.String(), nullable=False, server_default="queued"),
+        sa.Column("stage", sa.String(), nullable=True),
+        sa.Column("files_total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("files_processed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("chunks_processed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("worker_id", sa.String(), nullable=True),
+        sa.Column("result", postgresql.JSONB(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False
+        ),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["repo_id"], ["repos.id"], ondelete="CASCADE"),
+    )
+    op.create_index("ix_index_jobs_repo_id", "index_jobs", ["repo_id"])
+    op.create_index("ix_index_jobs_status", "index_jobs", ["status"])
+    op.create_index(
+        "ux_index_jobs_active_repo",
+        "index_jobs",
+        ["repo_id"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_index_jobs_active_repo", table_name="index_jobs")
+    op.drop_index("ix_index_jobs_status", table_name="index_jobs")
+    op.drop_index("ix_index_jobs_repo_id", table_name="index_jobs")
+    op.drop_table("index_jobs")
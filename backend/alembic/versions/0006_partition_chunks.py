@@ -0,0 +1,104 @@
+"""partition chunks by repo
+
+Revision ID: 0006_partition_chunks
+Revises: 0005_index_jobs
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+from app.config import settings
+
+
+revision = "0006_partition_chunks"
+down_revision = "0005_index_jobs"
+branch_labels = None
+depends_on = None
+
+
+CHUNK_COLUMNS = "id, repo_id, path, language, start_line, end_line, content, embedding"
+
+
+def upgrade() -> None:
+    op.drop_index("ix_chunks_repo_embedding_ivfflat", table_name="chunks")
+    op.drop_index("ix_chunks_repo_id", table_name="chunks")
+    op.rename_table("chunks", "chunks_unpartitioned")
+    op.execute(
+        "ALTER TABLE chunks_unpartitioned RENAME CONSTRAINT chunks_pkey TO chunks_unpartitioned_pkey"
+    )
+
+    op.execute(
+        f"""
+        CREATE TABLE chunks (
+            id uuid NOT NULL,
+            repo_id uuid NOT NULL REFERENCES repos (id) ON DELETE CASCADE,
+            path varchar NOT NULL,
+            language varchar NOT NULL,
+            start_line integer NOT NULL,
+            end_line integer NOT NULL,
+            content text NOT NULL,
+            embedding vector({settings.embedding_dim}) NOT NULL,
+            PRIMARY KEY (repo_id, id)
+        ) PARTITION BY LIST (repo_id)
+        """
+    )
+    op.execute("CREATE TABLE chunks_default PARTITION OF chunks DEFAULT")
+
+    bind = op.get_bind()
+    repo_ids = bind.execute(sa.text("SELECT id FROM repos")).scalars().all()
+    for repo_id in repo_ids:
+        op.execute(
+            f"CREATE TABLE chunks_p_{repo_id.hex} PARTITION OF chunks FOR VALUES IN ('{repo_id}')"
+        )
+
+    op.execute(
+        f"INSERT INTO chunks ({CHUNK_COLUMNS}) SELECT {CHUNK_COLUMNS} FROM chunks_unpartitioned"
+    )
+    op.drop_table("chunks_unpartitioned")
+
+    for repo_id in repo_ids:
+        partition = f"chunks_p_{repo_id.hex}"
+        if settings.vector_index_type == "hnsw":
+            options = f"m = {settings.hnsw_m}, ef_construction = {settings.hnsw_ef_construction}"
+        else:
+            rows = bind.execute(sa.text(f"SELECT count(*) FROM {partition}")).scalar_one()
+            options = f"lists = {settings.ivfflat_lists or max(1, min(4096, rows // 1000))}"
+        op.execute(
+            f"CREATE INDEX ix_{partition}_embedding ON {partition} "
+            f"USING {settings.vector_index_type} (embedding vector_l2_ops) WITH ({options})"
+        )
+
+
+def downgrade() -> None:
+    op.rename_table("chunks", "chunks_partitioned")
+    op.execute(
+        "ALTER TABLE chunks_partitioned RENAME CONSTRAINT chunks_pkey TO chunks_partitioned_pkey"
+    )
+    op.create_table(
+        "chunks",
+        sa.Column("id", sa.dialects.postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("repo_id", sa.dialects.postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("language", sa.String(), nullable=False),
+        sa.Column("start_line", sa.Integer(), nullable=False),
+        sa.Column("end_line", sa.Integer(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("embedding", Vector(settings.embedding_dim), nullable=False),
+        sa.ForeignKeyConstraint(["repo_id"], ["repos.id"], ondelete="CASCADE"),
+    )
+    op.execute(
+        f"INSERT INTO chunks ({CHUNK_COLUMNS}) SELECT {CHUNK_COLUMNS} FROM chunks_partitioned"
+    )
+    op.drop_table("chunks_partitioned")
+    op.create_index("ix_chunks_repo_id", "chunks", ["repo_id"])
+    op.create_index(
+        "ix_chunks_repo_embedding_ivfflat",
+        "chunks",
+        ["embedding"],
+        postgresql_using="ivfflat",
+        postgresql_with={"lists": 100},
+        postgresql_ops={"embedding": "vector_l2_ops"},
+    )
@@ -0,0 +1,30 @@
+"""add full-text search to chunks
+
+Revision ID: 0007_chunk_search
+Revises: 0006_partition_chunks
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+
+
+revision = "0007_chunk_search"
+down_revision = "0006_partition_chunks"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        ALTER TABLE chunks ADD COLUMN content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', path || ' ' || content)) STORED
+        """
+    )
+    op.execute("CREATE INDEX ix_chunks_content_tsv ON chunks USING gin (content_tsv)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_chunks_content_tsv")
+    op.execute("ALTER TABLE chunks DROP COLUMN content_tsv")
@@ -0,0 +1,26 @@
+"""add repo index version
+
+Revision ID: 0008_repo_index_version
+Revises: 0007_chunk_search
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_repo_index_version"
+down_revision = "0007_chunk_search"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "repos", sa.Column("index_version", sa.Integer(), nullable=False, server_default="0")
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("repos", "index_version")
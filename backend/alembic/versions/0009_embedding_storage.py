@@ -0,0 +1,90 @@
+"""store embeddings with the configured type and dimension
+
+Revision ID: 0009_embedding_storage
+Revises: 0008_repo_index_version
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+revision = "0009_embedding_storage"
+down_revision = "0008_repo_index_version"
+branch_labels = None
+depends_on = None
+
+
+def _embedding_type(bind) -> str:
+    return bind.execute(
+        sa.text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'chunks'::regclass AND attname = 'embedding'"
+        )
+    ).scalar_one()
+
+
+def _drop_vector_indexes(repo_ids) -> None:
+    for repo_id in repo_ids:
+        op.execute(f"DROP INDEX IF EXISTS ix_chunks_p_{repo_id.hex}_embedding")
+
+
+def _create_vector_indexes(bind, repo_ids, target: str) -> None:
+    for repo_id in repo_ids:
+        partition = f"chunks_p_{repo_id.hex}"
+        exists = bind.execute(sa.text("SELECT to_regclass(:name)"), {"name": partition}).scalar()
+        rows = bind.execute(sa.text(f"SELECT count(*) FROM {partition}")).scalar() if exists else 0
+        if not rows:
+            continue
+        if settings.vector_index_type == "hnsw":
+            options = f"m = {settings.hnsw_m}, ef_construction = {settings.hnsw_ef_construction}"
+        else:
+            options = f"lists = {settings.ivfflat_lists or max(1, min(4096, rows // 1000))}"
+        op.execute(
+            f"CREATE INDEX ix_{partition}_embedding ON {partition} "
+            f"USING {settings.vector_index_type} ({target}) WITH ({options})"
+        )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    repo_ids = bind.execute(sa.text("SELECT id FROM repos")).scalars().all()
+    current = _embedding_type(bind)
+    dim = int(current.split("(")[1].rstrip(")"))
+    target_type = f"{settings.embedding_storage}({settings.embedding_dim})"
+
+    _drop_vector_indexes(repo_ids)
+    if dim != settings.embedding_dim:
+        # Embeddings of a different dimension cannot be converted; repos must be reindexed.
+        op.execute("DELETE FROM chunks")
+        op.execute("DELETE FROM repo_files")
+        op.execute("UPDATE repos SET status = 'not_indexed', index_version = index_version + 1")
+    if current != target_type:
+        op.execute(
+            f"ALTER TABLE chunks ALTER COLUMN embedding TYPE {target_type} "
+            f"USING embedding::{target_type}"
+        )
+
+    if settings.vector_index_quantization == "binary":
+        target = f"(binary_quantize(embedding)::bit({settings.embedding_dim})) bit_hamming_ops"
+    else:
+        target = f"embedding {settings.embedding_storage}_l2_ops"
+    _create_vector_indexes(bind, repo_ids, target)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    repo_ids = bind.execute(sa.text("SELECT id FROM repos")).scalars().all()
+    current = _embedding_type(bind)
+    dim = int(current.split("(")[1].rstrip(")"))
+
+    _drop_vector_indexes(repo_ids)
+    if not current.startswith("vector("):
+        op.execute(
+            f"ALTER TABLE chunks ALTER COLUMN embedding TYPE vector({dim}) "
+            f"USING embedding::vector({dim})"
+        )
+    _create_vector_indexes(bind, repo_ids, "embedding vector_l2_ops")
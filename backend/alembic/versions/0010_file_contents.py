@@ -0,0 +1,56 @@
+"""store file contents once per repo and reference them from chunks
+
+Revision ID: 0010_file_contents
+Revises: 0009_embedding_storage
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_file_contents"
+down_revision = "0009_embedding_storage"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    op.add_column("repo_files", sa.Column("content", sa.Text(), nullable=True))
+    lz4 = bind.execute(
+        sa.text(
+            "SELECT 'lz4' = ANY(enumvals) FROM pg_settings "
+            "WHERE name = 'default_toast_compression'"
+        )
+    ).scalar()
+    if lz4:
+        op.execute("ALTER TABLE repo_files ALTER COLUMN content SET COMPRESSION lz4")
+
+    op.add_column("chunks", sa.Column("start_offset", sa.Integer(), nullable=True))
+    op.add_column("chunks", sa.Column("end_offset", sa.Integer(), nullable=True))
+    op.alter_column("chunks", "content", nullable=True)
+    op.execute("ALTER TABLE chunks ALTER COLUMN content_tsv DROP EXPRESSION")
+    # Existing chunks keep their inline content; the next index run rewrites every file.
+    op.execute("UPDATE repo_files SET content_hash = ''")
+
+
+def downgrade() -> None:
+    op.execute(
+        "UPDATE chunks SET content = substr(f.content, chunks.start_offset + 1, "
+        "chunks.end_offset - chunks.start_offset) FROM repo_files f "
+        "WHERE chunks.content IS NULL AND f.repo_id = chunks.repo_id AND f.path = chunks.path"
+    )
+    op.execute("DELETE FROM chunks WHERE content IS NULL")
+    op.alter_column("chunks", "content", nullable=False)
+    op.execute("DROP INDEX IF EXISTS ix_chunks_content_tsv")
+    op.execute("ALTER TABLE chunks DROP COLUMN content_tsv")
+    op.execute(
+        "ALTER TABLE chunks ADD COLUMN content_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', path || ' ' || content)) STORED"
+    )
+    op.execute("CREATE INDEX ix_chunks_content_tsv ON chunks USING gin (content_tsv)")
+    op.drop_column("chunks", "end_offset")
+    op.drop_column("chunks", "start_offset")
+    op.drop_column("repo_files", "content")
@@ -0,0 +1,50 @@
+"""store one symbol row per chunk declaration with exact and trigram lookup indexes
+
+Revision ID: 0012_chunk_symbols
+Revises: 0011_repo_groups
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0012_chunk_symbols"
+down_revision = "0011_repo_groups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    op.create_table(
+        "chunk_symbols",
+        sa.Column(
+            "repo_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("repos.id"),
+            primary_key=True,
+        ),
+        sa.Column("chunk_id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("kind", sa.String(), primary_key=True),
+        sa.Column("qualified_name", sa.String(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+    )
+    op.execute("CREATE INDEX ix_chunk_symbols_name ON chunk_symbols (lower(name), repo_id)")
+    trgm = bind.execute(
+        sa.text("SELECT count(*) FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).scalar()
+    if trgm:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX ix_chunk_symbols_name_trgm ON chunk_symbols "
+            "USING gin (lower(name) gin_trgm_ops)"
+        )
+    # Symbols were never stored, so the next index run rewrites every file.
+    op.execute("UPDATE repo_files SET content_hash = ''")
+
+
+def downgrade() -> None:
+    op.drop_table("chunk_symbols")
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -9,17 +10,125 @@ load_dotenv()
 class Settings:
     def __init__(self) -> None:
         self.database_url = os.getenv("DATABASE_URL")
+        self.async_db_pool_size = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+        self.async_db_max_overflow = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
         self.chat_model = os.getenv("CHAT_MODEL", "gpt-4o-mini")
         self.chat_temperature = float(os.getenv("CHAT_TEMPERATURE", "0.2"))
         self.rag_debug = os.getenv("RAG_DEBUG", "false").strip() == "True"
+        self.embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
         self.embedding_dim = self._resolve_embedding_dim()
+        self.embedding_storage = os.getenv("EMBEDDING_STORAGE", "vector").strip().lower()
+        self.openai_base_url = os.getenv("OPENAI_BASE_URL") or None
+        self.openai_max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+        self.openai_max_keepalive_connections = int(
+            os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "16")
+        )
+        self.openai_keepalive_seconds = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+        self.openai_timeout_seconds = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+        self.query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+        self.query_cache_ttl_seconds = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+        self.query_cache_shared = os.getenv("QUERY_CACHE_SHARED", "false").strip() == "true"
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+        self.embedding_batch_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+        self.embedding_concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+        self.embedding_max_concurrency = max(
+            int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "16")), self.embedding_concurrency
+        )
+        self.embedding_rpm_limit = int(os.getenv("EMBEDDING_RPM_LIMIT", "0"))
+        self.embedding_tpm_limit = int(os.getenv("EMBEDDING_TPM_LIMIT", "0"))
+        self.embedding_max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+        self.embedding_retry_base_seconds = float(
+            os.getenv("EMBEDDING_RETRY_BASE_SECONDS", "0.5")
+        )
+        self.embedding_retry_max_seconds = float(os.getenv("EMBEDDING_RETRY_MAX_SECONDS", "30"))
+        self.ingest_mode = os.getenv("INGEST_MODE", "checkout").strip().lower()
+        self.chunk_workers = int(os.getenv("CHUNK_WORKERS", str(os.cpu_count() or 1)))
+        self.chunk_snap_lines = os.getenv("CHUNK_SNAP_LINES", "false").strip() == "true"
+        self.pipeline_queue_depth = int(os.getenv("PIPELINE_QUEUE_DEPTH", "4"))
+        self.chunk_write_mode = os.getenv("CHUNK_WRITE_MODE", "copy").strip().lower()
+        self.chunk_write_batch_size = int(os.getenv("CHUNK_WRITE_BATCH_SIZE", "1000"))
+        self.chunk_commit_interval = int(os.getenv("CHUNK_COMMIT_INTERVAL", "5000"))
+        self.embedding_cache_enabled = os.getenv("EMBEDDING_CACHE", "true").strip() == "true"
+        self.embedding_cache_max_rows = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "2000000"))
+        self.embedding_cache_max_age_days = int(os.getenv("EMBEDDING_CACHE_MAX_AGE_DAYS", "90"))
+        self.vector_index_type = os.getenv("VECTOR_INDEX_TYPE", "hnsw").strip().lower()
+        self.hnsw_m = int(os.getenv("HNSW_M", "16"))
+        self.hnsw_ef_construction = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+        self.hnsw_ef_search = int(os.getenv("HNSW_EF_SEARCH", "40"))
+        self.ivfflat_lists = int(os.getenv("IVFFLAT_LISTS", "0"))
+        self.ivfflat_probes = int(os.getenv("IVFFLAT_PROBES", "10"))
+        self.ivfflat_rebuild_ratio = float(os.getenv("IVFFLAT_REBUILD_RATIO", "0.2"))
+        self.vector_index_quantization = (
+            os.getenv("VECTOR_INDEX_QUANTIZATION", "none").strip().lower()
+        )
+        self.binary_rerank_factor = int(os.getenv("BINARY_RERANK_FACTOR", "4"))
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid").strip().lower()
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "50"))
+        self.hybrid_rrf_k = int(os.getenv("HYBRID_RRF_K", "60"))
+        self.hybrid_vector_weight = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+        self.hybrid_text_weight = float(os.getenv("HYBRID_TEXT_WEIGHT", "1.0"))
+        self.retrieval_top_k = int(os.getenv("RETRIEVAL_TOP_K", "10"))
+        self.retrieval_mmr = os.getenv("RETRIEVAL_MMR", "false").strip() == "true"
+        self.mmr_lambda = float(os.getenv("MMR_LAMBDA", "0.7"))
+        self.mmr_pool_size = int(os.getenv("MMR_POOL_SIZE", "40"))
+        self.symbol_lookup_limit = int(os.getenv("SYMBOL_LOOKUP_LIMIT", "3"))
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+        self.chat_batch_max_questions = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "50"))
+        self.chat_batch_concurrency = max(1, int(os.getenv("CHAT_BATCH_CONCURRENCY", "8")))
+        self.cross_repo_max_repos = int(os.getenv("CROSS_REPO_MAX_REPOS", "50"))
+        self.vector_engine = os.getenv("VECTOR_ENGINE", "postgres").strip().lower()
+        self.vector_cache_dir = os.getenv(
+            "VECTOR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "code-doc-vectors")
+        )
+        self.vector_cache_max_mb = int(os.getenv("VECTOR_CACHE_MAX_MB", "1024"))
+        self.vector_cache_dtype = os.getenv("VECTOR_CACHE_DTYPE", "float32").strip().lower()
+        self.index_workers = int(os.getenv("INDEX_WORKERS", "2"))
+        self.worker_metrics_port = int(os.getenv("WORKER_METRICS_PORT", "0"))
+        self.job_poll_seconds = float(os.getenv("JOB_POLL_SECONDS", "2"))
+        self.job_heartbeat_seconds = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+        self.job_stale_seconds = int(os.getenv("JOB_STALE_SECONDS", "120"))
+        self.job_max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
 
         if not self.database_url:
             raise RuntimeError("DATABASE_URL is required")
+        if self.ingest_mode not in {"checkout", "blobs"}:
+            raise RuntimeError("INGEST_MODE must be one of: checkout, blobs")
+        if self.chunk_write_mode not in {"orm", "insert", "copy"}:
+            raise RuntimeError("CHUNK_WRITE_MODE must be one of: orm, insert, copy")
+        if self.vector_index_type not in {"hnsw", "ivfflat"}:
+            raise RuntimeError("VECTOR_INDEX_TYPE must be one of: hnsw, ivfflat")
+        if self.embedding_storage not in {"vector", "halfvec"}:
+            raise RuntimeError("EMBEDDING_STORAGE must be one of: vector, halfvec")
+        if self.vector_index_quantization not in {"none", "binary"}:
+            raise RuntimeError("VECTOR_INDEX_QUANTIZATION must be one of: none, binary")
+        if self.retrieval_mode not in {"vector", "hybrid"}:
+            raise RuntimeError("RETRIEVAL_MODE must be one of: vector, hybrid")
+        if not 0 <= self.mmr_lambda <= 1:
+            raise RuntimeError("MMR_LAMBDA must be between 0 and 1")
+        if self.vector_engine not in {"postgres", "numpy"}:
+            raise RuntimeError("VECTOR_ENGINE must be one of: postgres, numpy")
+        if self.vector_cache_dtype not in {"float32", "float16"}:
+            raise RuntimeError("VECTOR_CACHE_DTYPE must be one of: float32, float16")
+        self.async_database_url = self._resolve_async_database_url()
+
+    def _resolve_async_database_url(self) -> str:
+        override = os.getenv("ASYNC_DATABASE_URL")
+        if override:
+            return override
+
+        _, _, rest = self.database_url.partition("://")
+        return f"postgresql+asyncpg://{rest}".replace("sslmode=", "ssl=")
 
     def _resolve_embedding_dim(self) -> int:
+        if self.embedding_dimensions:
+            if not self.embedding_model.startswith("text-embedding-3"):
+                raise RuntimeError(
+                    "EMBEDDING_DIMENSIONS is only supported by text-embedding-3 models"
+                )
+            return self.embedding_dimensions
+
         override = os.getenv("EMBEDDING_DIM")
         if override:
             return int(override)
@@ -1,18 +1,52 @@
+import asyncio
+import json
+import logging
 import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Literal, TypeVar
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
 
-from app.db import SessionLocal
-from app.models import Repo
+from app.config import settings
+from app.db import AsyncSessionLocal, async_engine
+from app.models import IndexJob, Repo, RepoGroup
 from app.services.github import validate_github_url
-from app.services.indexing import index_repo
-from app.services.rag import answer_question
+from app.services.jobs import enqueue_index_job, job_metrics, latest_job
+from app.services.metrics import TraceMiddleware, render_metrics
+from app.services.openai_client import close_async_openai_client
+from app.services.query_cache import query_cache
+from app.services.rag import (
+    PreparedAnswer,
+    RetrievalOptions,
+    generate_answer,
+    generate_answers,
+    prepare_answer,
+    prepare_answers,
+    prepare_multi_answer,
+    search_repos,
+    stream_answer,
+)
+from app.services.vector_store import vector_store
+
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
 
 
-app = FastAPI(title="Code Documentation Assistant")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_async_openai_client()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Code Documentation Assistant", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,7 +54,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+app.add_middleware(TraceMiddleware)
 
 
 class RepoCreate(BaseModel):
@@ -39,14 +75,82 @@ class IndexRequest(BaseModel):
     github_url: str | None = None
 
 
-class ChatRequest(BaseModel):
+class IndexJobResponse(BaseModel):
+    repo_id: uuid.UUID
+    repo_status: str
+    job_id: uuid.UUID | None = None
+    status: str | None = None
+    stage: str | None = None
+    files_total: int = 0
+    files_processed: int = 0
+    chunks_processed: int = 0
+    attempts: int = 0
+    error: str | None = None
+    result: dict | None = None
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    elapsed_seconds: float | None = None
+    files_per_second: float | None = None
+    chunks_per_second: float | None = None
+    eta_seconds: float | None = None
+
+
+class RetrievalParams(BaseModel):
+    retrieval_mode: Literal["vector", "hybrid"] | None = None
+    vector_weight: float | None = Field(default=None, ge=0)
+    text_weight: float | None = Field(default=None, ge=0)
+    mmr: bool | None = None
+    mmr_lambda: float | None = Field(default=None, ge=0, le=1)
+    mmr_pool_size: int | None = Field(default=None, ge=1, le=500)
+
+    def retrieval_options(self) -> RetrievalOptions:
+        return RetrievalOptions(
+            self.retrieval_mode,
+            self.vector_weight,
+            self.text_weight,
+            self.mmr,
+            self.mmr_lambda,
+            self.mmr_pool_size,
+        )
+
+
+class ChatRequest(RetrievalParams):
     question: str
 
 
+class ChatBatchRequest(RetrievalParams):
+    questions: list[str] = Field(min_length=1, max_length=settings.chat_batch_max_questions)
+
+
+class RepoGroupRequest(BaseModel):
+    repo_ids: list[uuid.UUID] = Field(min_length=1, max_length=settings.cross_repo_max_repos)
+
+
+class RepoGroupResponse(BaseModel):
+    name: str
+    repo_ids: list[uuid.UUID]
+
+
+class CrossRepoRequest(RetrievalParams):
+    question: str
+    repo_ids: list[uuid.UUID] | None = Field(
+        default=None, min_length=1, max_length=settings.cross_repo_max_repos
+    )
+    group: str | None = None
+    per_repo_limit: int | None = Field(default=None, ge=1)
+
+
+class CrossRepoSearchRequest(CrossRepoRequest):
+    top_k: int | None = Field(default=None, ge=1, le=100)
+
+
 @app.get("/repos", response_model=list[RepoResponse])
-def list_repos():
-    with SessionLocal() as session:
-        repos = session.query(Repo).order_by(Repo.created_at.desc()).all()
+async def list_repos():
+    async with AsyncSessionLocal() as session:
+        repos = (
+            await session.execute(select(Repo).order_by(Repo.created_at.desc()))
+        ).scalars()
         return [
             RepoResponse(
                 repo_id=repo.id,
@@ -59,18 +163,18 @@ def list_repos():
 
 
 @app.post("/repos", response_model=RepoResponse)
-def create_repo(payload: RepoCreate):
+async def create_repo(payload: RepoCreate):
     if payload.github_url:
-        repo_info = validate_github_url(payload.github_url)
+        repo_info = await run_in_threadpool(validate_github_url, payload.github_url)
         github_url = repo_info.url
     else:
         github_url = None
 
-    with SessionLocal() as session:
+    async with AsyncSessionLocal() as session:
         repo = Repo(name=payload.name, github_url=github_url)
         session.add(repo)
-        session.commit()
-        session.refresh(repo)
+        await session.commit()
+        await session.refresh(repo)
 
         return RepoResponse(
             repo_id=repo.id,
@@ -80,28 +184,266 @@ def create_repo(payload: RepoCreate):
         )
 
 
-@app.post("/repos/{repo_id}/index")
-def index_repo_endpoint(repo_id: uuid.UUID, payload: IndexRequest | None = None):
-    with SessionLocal() as session:
-        repo = session.get(Repo, repo_id)
+def _job_response(repo: Repo, job: IndexJob | None) -> IndexJobResponse:
+    if job is None:
+        return IndexJobResponse(repo_id=repo.id, repo_status=repo.status)
+
+    return IndexJobResponse(
+        repo_id=repo.id,
+        repo_status=repo.status,
+        job_id=job.id,
+        status=job.status,
+        stage=job.stage,
+        files_total=job.files_total,
+        files_processed=job.files_processed,
+        chunks_processed=job.chunks_processed,
+        attempts=job.attempts,
+        error=job.error,
+        result=job.result,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        **job_metrics(job),
+    )
+
+
+@app.post("/repos/{repo_id}/index", response_model=IndexJobResponse, status_code=202)
+async def index_repo_endpoint(repo_id: uuid.UUID, payload: IndexRequest | None = None):
+    async with AsyncSessionLocal() as session:
+        repo = await session.get(Repo, repo_id)
+        if not repo:
+            raise HTTPException(status_code=404, detail="Repo not found")
+
+        if payload and payload.github_url:
+            repo_info = await run_in_threadpool(validate_github_url, payload.github_url)
+            repo.github_url = repo_info.url
+            await session.commit()
+
+        if not repo.github_url:
+            raise HTTPException(status_code=400, detail="github_url is required")
+
+        job = await session.run_sync(enqueue_index_job, repo)
+        return _job_response(repo, job)
+
+
+@app.get("/repos/{repo_id}/index/status", response_model=IndexJobResponse)
+async def index_status_endpoint(repo_id: uuid.UUID):
+    async with AsyncSessionLocal() as session:
+        repo = await session.get(Repo, repo_id)
         if not repo:
             raise HTTPException(status_code=404, detail="Repo not found")
 
-        github_url = payload.github_url if payload else None
-        files_indexed, chunks_indexed = index_repo(session, repo, github_url)
-        return {
-            "status": "ok",
-            "files_indexed": files_indexed,
-            "chunks_indexed": chunks_indexed,
-        }
+        return _job_response(repo, await session.run_sync(latest_job, repo.id))
+
+
+async def _cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    task = asyncio.ensure_future(awaitable)
+
+    async def watch() -> None:
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        task.cancel()
+
+    watcher = asyncio.create_task(watch())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise
+        raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        watcher.cancel()
+
+
+async def _prepare_chat(repo_id: uuid.UUID, payload: ChatRequest) -> PreparedAnswer:
+    async with AsyncSessionLocal() as session:
+        repo = await session.get(Repo, repo_id)
+        if not repo:
+            raise HTTPException(status_code=404, detail="Repo not found")
+        return await prepare_answer(
+            session, repo, payload.question, payload.retrieval_options()
+        )
+
+
+async def _chat(repo_id: uuid.UUID, payload: ChatRequest):
+    answer, sources = await generate_answer(await _prepare_chat(repo_id, payload))
+    return {"answer": answer, "sources": sources}
 
 
 @app.post("/repos/{repo_id}/chat")
-def chat_repo(repo_id: uuid.UUID, payload: ChatRequest):
-    with SessionLocal() as session:
-        repo = session.get(Repo, repo_id)
+async def chat_repo(repo_id: uuid.UUID, payload: ChatRequest, request: Request):
+    return await _cancel_on_disconnect(request, _chat(repo_id, payload))
+
+
+async def _prepare_chat_batch(
+    repo_id: uuid.UUID, payload: ChatBatchRequest
+) -> list[PreparedAnswer]:
+    async with AsyncSessionLocal() as session:
+        repo = await session.get(Repo, repo_id)
         if not repo:
             raise HTTPException(status_code=404, detail="Repo not found")
+        return await prepare_answers(
+            session, repo, payload.questions, payload.retrieval_options()
+        )
+
+
+async def _chat_batch(repo_id: uuid.UUID, payload: ChatBatchRequest):
+    results = await generate_answers(await _prepare_chat_batch(repo_id, payload))
+    answers = []
+    for question, result in zip(payload.questions, results):
+        if isinstance(result, BaseException):
+            logger.error("chat_batch_answer_failed", exc_info=result)
+            answers.append({"question": question, "error": "Answer generation failed"})
+        else:
+            answer, sources = result
+            answers.append({"question": question, "answer": answer, "sources": sources})
+    return {"answers": answers}
+
+
+@app.post("/repos/{repo_id}/chat/batch")
+async def chat_repo_batch(repo_id: uuid.UUID, payload: ChatBatchRequest, request: Request):
+    return await _cancel_on_disconnect(request, _chat_batch(repo_id, payload))
+
+
+async def _check_repos(session, repo_ids: list[uuid.UUID]) -> None:
+    found = (await session.execute(select(Repo.id).where(Repo.id.in_(repo_ids)))).scalars()
+    if len(set(found)) != len(repo_ids):
+        raise HTTPException(status_code=404, detail="Repo not found")
+
+
+@app.get("/repo-groups", response_model=list[RepoGroupResponse])
+async def list_repo_groups():
+    async with AsyncSessionLocal() as session:
+        groups = (await session.execute(select(RepoGroup).order_by(RepoGroup.name))).scalars()
+        return [RepoGroupResponse(name=group.name, repo_ids=group.repo_ids) for group in groups]
+
+
+@app.put("/repo-groups/{name}", response_model=RepoGroupResponse)
+async def put_repo_group(name: str, payload: RepoGroupRequest):
+    repo_ids = list(dict.fromkeys(payload.repo_ids))
+    async with AsyncSessionLocal() as session:
+        await _check_repos(session, repo_ids)
+
+        group = await session.get(RepoGroup, name)
+        if group is None:
+            group = RepoGroup(name=name)
+            session.add(group)
+        group.repo_ids = repo_ids
+        await session.commit()
+        return RepoGroupResponse(name=name, repo_ids=repo_ids)
+
+
+@app.delete("/repo-groups/{name}", status_code=204)
+async def delete_repo_group(name: str):
+    async with AsyncSessionLocal() as session:
+        group = await session.get(RepoGroup, name)
+        if group is None:
+            raise HTTPException(status_code=404, detail="Repo group not found")
+        await session.delete(group)
+        await session.commit()
+    return Response(status_code=204)
+
+
+async def _resolve_repo_ids(session, payload: CrossRepoRequest) -> list[uuid.UUID]:
+    if (payload.repo_ids is None) == (payload.group is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of repo_ids or group")
+    if payload.group is not None:
+        group = await session.get(RepoGroup, payload.group)
+        if group is None:
+            raise HTTPException(status_code=404, detail="Repo group not found")
+        repo_ids = list(group.repo_ids)
+    else:
+        repo_ids = list(dict.fromkeys(payload.repo_ids))
+
+    await _check_repos(session, repo_ids)
+    return repo_ids
+
+
+async def _search(payload: CrossRepoSearchRequest):
+    async with AsyncSessionLocal() as session:
+        repo_ids = await _resolve_repo_ids(session, payload)
+        chunks = await search_repos(
+            session,
+            repo_ids,
+            payload.question,
+            payload.top_k or settings.retrieval_top_k,
+            payload.retrieval_options(),
+            payload.per_repo_limit,
+        )
+    return {
+        "results": [
+            {
+                "repo_id": chunk.repo_id,
+                "repo": chunk.repo,
+                "path": chunk.path,
+                "start_line": chunk.start_line,
+                "end_line": chunk.end_line,
+                "content": chunk.content,
+            }
+            for chunk in chunks
+        ]
+    }
+
+
+@app.post("/search")
+async def search(payload: CrossRepoSearchRequest, request: Request):
+    return await _cancel_on_disconnect(request, _search(payload))
+
+
+async def _cross_repo_chat(payload: CrossRepoRequest):
+    async with AsyncSessionLocal() as session:
+        repo_ids = await _resolve_repo_ids(session, payload)
+        prepared = await prepare_multi_answer(
+            session,
+            repo_ids,
+            payload.question,
+            payload.retrieval_options(),
+            payload.per_repo_limit,
+        )
+    answer, sources = await generate_answer(prepared)
+    return {"answer": answer, "sources": sources}
+
+
+@app.post("/chat")
+async def cross_repo_chat(payload: CrossRepoRequest, request: Request):
+    return await _cancel_on_disconnect(request, _cross_repo_chat(payload))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _chat_events(prepared: PreparedAnswer) -> AsyncIterator[str]:
+    try:
+        async for event, data in stream_answer(prepared):
+            yield _sse(event, data)
+    except Exception:
+        logger.exception("chat_stream_failed")
+        yield _sse("error", {"detail": "Answer generation failed"})
+
+
+@app.post("/repos/{repo_id}/chat/stream")
+async def chat_repo_stream(repo_id: uuid.UUID, payload: ChatRequest, request: Request):
+    prepared = await _cancel_on_disconnect(request, _prepare_chat(repo_id, payload))
+
+    return StreamingResponse(
+        _chat_events(prepared),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/stats/query-cache")
+async def query_cache_stats():
+    return query_cache.stats()
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    content, content_type = render_metrics(request.headers.get("accept"))
+    return Response(content=content, media_type=content_type)
+
 
-        answer, sources = answer_question(session, repo, payload.question)
-        return {"answer": answer, "sources": sources}
+@app.get("/stats/vector-store")
+async def vector_store_stats():
+    return vector_store.stats()
@@ -1,9 +1,20 @@
 import uuid
 
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, func
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR, UUID
+from sqlalchemy.orm import column_property, declarative_base, deferred, relationship
 
 from app.config import settings
 
@@ -11,6 +22,18 @@ from app.config import settings
 Base = declarative_base()
 
 
+class HalfVector(Vector):
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        if self.dim is None:
+            return "HALFVEC"
+        return "HALFVEC(%d)" % self.dim
+
+
+EMBEDDING_TYPES = {"vector": Vector, "halfvec": HalfVector}
+
+
 class Repo(Base):
     __tablename__ = "repos"
 
@@ -18,30 +41,131 @@ class Repo(Base):
     name = Column(String, nullable=True)
     github_url = Column(String, nullable=True)
     status = Column(String, nullable=False, server_default="not_indexed")
+    index_version = Column(Integer, nullable=False, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     chunks = relationship("Chunk", back_populates="repo", cascade="all, delete")
+    files = relationship("RepoFile", back_populates="repo", cascade="all, delete")
+    jobs = relationship("IndexJob", back_populates="repo", cascade="all, delete")
+    symbols = relationship("ChunkSymbol", back_populates="repo", cascade="all, delete")
 
 
 class Chunk(Base):
     __tablename__ = "chunks"
+    __table_args__ = (
+        Index("ix_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+        {"postgresql_partition_by": "LIST (repo_id)"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    repo_id = Column(UUID(as_uuid=True), ForeignKey("repos.id"), nullable=False, index=True)
+    repo_id = Column(UUID(as_uuid=True), ForeignKey("repos.id"), primary_key=True)
     path = Column(String, nullable=False)
     language = Column(String, nullable=False)
     start_line = Column(Integer, nullable=False)
     end_line = Column(Integer, nullable=False)
-    content = Column(Text, nullable=False)
-    embedding = Column(Vector(settings.embedding_dim), nullable=False)
+    start_offset = Column(Integer, nullable=True)
+    end_offset = Column(Integer, nullable=True)
+    # Only set on rows written before file contents moved to repo_files.
+    inline_content = deferred(Column("content", Text, nullable=True))
+    embedding = deferred(
+        Column(EMBEDDING_TYPES[settings.embedding_storage](settings.embedding_dim), nullable=False)
+    )
+    content_tsv = deferred(Column(TSVECTOR))
 
     repo = relationship("Repo", back_populates="chunks")
 
 
-Index(
-    "ix_chunks_repo_embedding_ivfflat",
-    Chunk.embedding,
-    postgresql_using="ivfflat",
-    postgresql_with={"lists": 100},
-    postgresql_ops={"embedding": "vector_l2_ops"},
+class ChunkSymbol(Base):
+    __tablename__ = "chunk_symbols"
+    __table_args__ = (Index("ix_chunk_symbols_name", text("lower(name)"), "repo_id"),)
+
+    repo_id = Column(UUID(as_uuid=True), ForeignKey("repos.id"), primary_key=True)
+    chunk_id = Column(UUID(as_uuid=True), primary_key=True)
+    kind = Column(String, primary_key=True)
+    qualified_name = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+
+    repo = relationship("Repo", back_populates="symbols")
+
+
+class RepoFile(Base):
+    __tablename__ = "repo_files"
+
+    repo_id = Column(UUID(as_uuid=True), ForeignKey("repos.id"), primary_key=True)
+    path = Column(String, primary_key=True)
+    content_hash = Column(String, nullable=False)
+    chunk_ids = Column(ARRAY(UUID(as_uuid=True)), nullable=False, server_default="{}")
+    content = deferred(Column(Text, nullable=True))
+    indexed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    repo = relationship("Repo", back_populates="files")
+
+
+Chunk.content = column_property(
+    func.coalesce(
+        Chunk.inline_content,
+        select(
+            func.substr(
+                RepoFile.content, Chunk.start_offset + 1, Chunk.end_offset - Chunk.start_offset
+            )
+        )
+        .where(RepoFile.repo_id == Chunk.repo_id, RepoFile.path == Chunk.path)
+        .correlate_except(RepoFile)
+        .scalar_subquery(),
+    )
 )
+
+
+class RepoGroup(Base):
+    __tablename__ = "repo_groups"
+
+    name = Column(String, primary_key=True)
+    repo_ids = Column(ARRAY(UUID(as_uuid=True)), nullable=False, server_default="{}")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
+class IndexJob(Base):
+    __tablename__ = "index_jobs"
+    __table_args__ = (
+        Index(
+            "ux_index_jobs_active_repo",
+            "repo_id",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    repo_id = Column(UUID(as_uuid=True), ForeignKey("repos.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, server_default="queued", index=True)
+    stage = Column(String, nullable=True)
+    files_total = Column(Integer, nullable=False, server_default="0")
+    files_processed = Column(Integer, nullable=False, server_default="0")
+    chunks_processed = Column(Integer, nullable=False, server_default="0")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    worker_id = Column(String, nullable=True)
+    result = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    repo = relationship("Repo", back_populates="jobs")
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    model = Column(String, primary_key=True)
+    dim = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), primary_key=True)
+    embedding = Column(Vector(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_used_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
+
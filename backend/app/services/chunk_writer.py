@@ -0,0 +1,163 @@
+import io
+import struct
+
+import numpy as np
+from pgvector.utils import to_db_binary
+from sqlalchemy import bindparam, func, insert, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Chunk, ChunkSymbol
+
+
+CHUNK_COLUMNS = (
+    "id",
+    "repo_id",
+    "path",
+    "language",
+    "start_line",
+    "end_line",
+    "start_offset",
+    "end_offset",
+    "embedding",
+)
+COPY_COLUMNS = (*CHUNK_COLUMNS, "search_text")
+SYMBOL_COLUMNS = ("repo_id", "chunk_id", "kind", "qualified_name", "name")
+STAGE_TABLE = "chunk_stage"
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+
+
+def _field(value: bytes) -> bytes:
+    return struct.pack(">i", len(value)) + value
+
+
+def _text_field(value: str | None) -> bytes:
+    return struct.pack(">i", -1) if value is None else _field(value.encode("utf-8"))
+
+
+def _embedding_binary(value) -> bytes:
+    if settings.embedding_storage == "halfvec":
+        value = np.asarray(value, dtype=">f2")
+        return struct.pack(">HH", value.shape[0], 0) + value.tobytes()
+    return to_db_binary(value)
+
+
+def _encode_row(row: dict) -> bytes:
+    return b"".join(
+        (
+            struct.pack(">h", len(COPY_COLUMNS)),
+            _field(row["id"].bytes),
+            _field(row["repo_id"].bytes),
+            _field(row["path"].encode("utf-8")),
+            _field(row["language"].encode("utf-8")),
+            _field(struct.pack(">i", row["start_line"])),
+            _field(struct.pack(">i", row["end_line"])),
+            _field(struct.pack(">i", row["start_offset"])),
+            _field(struct.pack(">i", row["end_offset"])),
+            _field(_embedding_binary(row["embedding"])),
+            _field(row["search_text"].encode("utf-8")),
+        )
+    )
+
+
+def _copy_rows(session: Session, rows: list[dict]) -> None:
+    buffer = io.BytesIO()
+    buffer.write(COPY_HEADER)
+    for row in rows:
+        buffer.write(_encode_row(row))
+    buffer.write(COPY_TRAILER)
+    buffer.seek(0)
+
+    # content_tsv is computed from chunk text that is not stored, so rows go through a
+    # temporary table and are inserted with to_tsvector().
+    columns = ", ".join(CHUNK_COLUMNS)
+    session.execute(
+        text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} ON COMMIT DELETE ROWS AS "
+            f"SELECT {columns}, ''::text AS search_text FROM chunks WITH NO DATA"
+        )
+    )
+    dbapi_connection = session.connection().connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {STAGE_TABLE} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+            buffer,
+        )
+    session.execute(
+        text(
+            f"INSERT INTO chunks ({columns}, content_tsv) "
+            f"SELECT {columns}, to_tsvector('english', search_text) FROM {STAGE_TABLE}"
+        )
+    )
+    session.execute(text(f"TRUNCATE {STAGE_TABLE}"))
+
+
+def _encode_symbol(row: dict) -> bytes:
+    return b"".join(
+        (
+            struct.pack(">h", len(SYMBOL_COLUMNS)),
+            _field(row["repo_id"].bytes),
+            _field(row["chunk_id"].bytes),
+            _text_field(row["kind"]),
+            _text_field(row["qualified_name"]),
+            _text_field(row["name"]),
+        )
+    )
+
+
+def _copy_symbols(session: Session, rows: list[dict]) -> None:
+    buffer = io.BytesIO()
+    buffer.write(COPY_HEADER)
+    for row in rows:
+        buffer.write(_encode_symbol(row))
+    buffer.write(COPY_TRAILER)
+    buffer.seek(0)
+    dbapi_connection = session.connection().connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY chunk_symbols ({', '.join(SYMBOL_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+            buffer,
+        )
+
+
+def _insert_statement():
+    return insert(Chunk).values(
+        content_tsv=func.to_tsvector("english", bindparam("search_text"))
+    )
+
+
+def write_chunks(session: Session, rows: list[dict]) -> None:
+    mode = settings.chunk_write_mode
+    batch_size = max(1, settings.chunk_write_batch_size)
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i : i + batch_size]
+        if mode == "copy":
+            _copy_rows(session, batch)
+        elif mode == "insert":
+            session.execute(_insert_statement(), batch)
+        else:
+            session.add_all(
+                Chunk(
+                    **{key: value for key, value in row.items() if key != "search_text"},
+                    content_tsv=func.to_tsvector("english", row["search_text"]),
+                )
+                for row in batch
+            )
+    if rows and mode == "orm":
+        session.flush()
+
+
+def write_symbols(session: Session, rows: list[dict]) -> None:
+    mode = settings.chunk_write_mode
+    batch_size = max(1, settings.chunk_write_batch_size)
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i : i + batch_size]
+        if mode == "copy":
+            _copy_symbols(session, batch)
+        elif mode == "insert":
+            session.execute(insert(ChunkSymbol), batch)
+        else:
+            session.add_all(ChunkSymbol(**row) for row in batch)
+    if rows and mode == "orm":
+        session.flush()
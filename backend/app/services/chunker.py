@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 import ast
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
 from typing import TypedDict
 
 
@@ -9,69 +12,140 @@ class Chunk(TypedDict):
     file_path: str
     language: str
     symbol: str | None
+    symbols: list[str]
     start_line: int
     end_line: int
+    start_offset: int
+    end_offset: int
 
 
-def sliding_window_chunks(
-    code_text: str,
+_SYMBOL_SEPARATOR = re.compile(r"\.|::")
+
+
+def parse_symbol(symbol: str) -> tuple[str, str, str]:
+    kind, _, qualified = symbol.rpartition(":")
+    return kind, qualified, _SYMBOL_SEPARATOR.split(qualified)[-1]
+
+
+class LineIndex:
+    def __init__(self, text: str):
+        self.text = text
+        self.starts = [0]
+        self.starts.extend(match.end() for match in re.finditer("\n", text))
+
+    def line_at(self, offset: int) -> int:
+        return bisect_right(self.starts, offset)
+
+    def line_range(self, start: int, end: int) -> tuple[int, int]:
+        return self.line_at(start), self.line_at(max(start, end - 1))
+
+    def line_span(self, start_line: int, end_line: int) -> tuple[int, int]:
+        start = max(1, start_line)
+        if start > len(self.starts):
+            return len(self.text), len(self.text)
+        end = min(max(start, end_line), len(self.starts))
+        stop = self.starts[end] if end < len(self.starts) else len(self.text)
+        offset = self.starts[start - 1]
+        while stop > offset and self.text[stop - 1] in "\r\n":
+            stop -= 1
+        return offset, stop
+
+    def snap_end(self, start: int, limit: int) -> int:
+        if limit >= len(self.text):
+            return len(self.text)
+        boundary = self.starts[bisect_right(self.starts, limit) - 1]
+        return boundary if boundary > start else limit
+
+    def snap_start(self, start: int, end: int, overlap: int) -> int:
+        target = max(end - overlap, start + 1)
+        i = bisect_left(self.starts, target)
+        if i < len(self.starts) and self.starts[i] <= end:
+            return self.starts[i]
+        return target
+
+
+def _make_chunk(
+    lines: LineIndex, start: int, end: int, file_path: str, language: str, symbols: list[str]
+) -> Chunk:
+    start_line, end_line = lines.line_range(start, end)
+    return {
+        "content": lines.text[start:end],
+        "file_path": file_path,
+        "language": language,
+        "symbol": symbols[0] if symbols else None,
+        "symbols": symbols,
+        "start_line": start_line,
+        "end_line": end_line,
+        "start_offset": start,
+        "end_offset": end,
+    }
+
+
+def _window_chunks(
+    lines: LineIndex,
+    start: int,
+    stop: int,
     file_path: str,
     language: str,
-    chunk_size: int = 1000,
-    overlap: int = 200,
+    symbols: list[str],
+    chunk_size: int,
+    overlap: int,
+    snap_lines: bool,
 ) -> list[Chunk]:
     chunks: list[Chunk] = []
     step = max(1, chunk_size - overlap)
-    for start in range(0, len(code_text), step):
-        end = min(len(code_text), start + chunk_size)
-        if start >= end:
-            break
-        start_line = 1 + code_text[:start].count("\n")
-        end_line = 1 + code_text[:end].count("\n")
-        chunks.append(
-            {
-                "content": code_text[start:end],
-                "file_path": file_path,
-                "language": language,
-                "symbol": None,
-                "start_line": start_line,
-                "end_line": end_line,
-            }
-        )
-        if end >= len(code_text):
+    while start < stop:
+        end = min(stop, start + chunk_size)
+        if snap_lines and end < stop:
+            end = lines.snap_end(start, end)
+        chunks.append(_make_chunk(lines, start, end, file_path, language, symbols))
+        if end >= stop:
             break
+        start = lines.snap_start(start, end, overlap) if snap_lines else start + step
     return chunks
 
 
-def _slice_lines(code_text: str, start_line: int, end_line: int) -> str:
-    lines = code_text.splitlines()
-    if not lines:
-        return ""
-    start = max(1, start_line)
-    end = max(start, end_line)
-    end = min(end, len(lines))
-    return "\n".join(lines[start - 1 : end])
+def sliding_window_chunks(
+    code_text: str,
+    file_path: str,
+    language: str,
+    chunk_size: int = 1000,
+    overlap: int = 200,
+    snap_lines: bool = False,
+    lines: LineIndex | None = None,
+) -> list[Chunk]:
+    lines = lines or LineIndex(code_text)
+    return _window_chunks(
+        lines, 0, len(code_text), file_path, language, [], chunk_size, overlap, snap_lines
+    )
 
 
-def chunk_python(code_text: str, file_path: str) -> list[Chunk] | None:
+def chunk_python(
+    code_text: str, file_path: str, lines: LineIndex | None = None
+) -> list[Chunk] | None:
     try:
         tree = ast.parse(code_text)
     except SyntaxError:
         return None
 
+    lines = lines or LineIndex(code_text)
     chunks: list[Chunk] = []
 
     def add_chunk(symbol: str, lineno: int, end_lineno: int) -> None:
         if lineno <= 0 or end_lineno <= 0 or end_lineno < lineno:
             return
+        start, stop = lines.line_span(lineno, end_lineno)
         chunks.append(
             {
-                "content": _slice_lines(code_text, lineno, end_lineno),
+                "content": lines.text[start:stop],
                 "file_path": file_path,
                 "language": "python",
                 "symbol": symbol,
+                "symbols": [symbol],
                 "start_line": lineno,
                 "end_line": end_lineno,
+                "start_offset": start,
+                "end_offset": stop,
             }
         )
 
@@ -91,17 +165,293 @@ def chunk_python(code_text: str, file_path: str) -> list[Chunk] | None:
     return chunks or None
 
 
+_DQ_STRING = r'"(?:\\.|[^"\\\n])*"'
+_SQ_STRING = r"'(?:\\.|[^'\\\n])*'"
+_TRIPLE_STRING = r'"""[\s\S]*?"""'
+_COMMENTS = r"//[^\n]*|/\*[\s\S]*?\*/"
+_PREPROCESSOR = r"(?m:^[ \t]*#[^\n]*(?:\\\n[^\n]*)*)"
+_JS_TEMPLATE = r"`(?:\\[\s\S]|[^`\\])*`"
+_JS_REGEX = r"(?<=[=(,:!&|?;{}\[])\s*/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/"
+_GO_RAW_STRING = r"`[^`]*`"
+_CS_VERBATIM_STRING = r'(?:\$@|@\$?)"(?:""|[^"])*"'
+
+_JS_DECL = (
+    r"(?m)^[ \t]*(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+    r"(?:function|class|interface|enum|namespace|module|const|let|var)\b"
+)
+_GO_DECL = r"(?m)^(?:func|type)\b"
+
+
+@dataclass(frozen=True)
+class BraceLanguage:
+    mask: re.Pattern
+    decl: re.Pattern | None = None
+
+
+def _brace_language(*tokens: str, decl: str | None = None) -> BraceLanguage:
+    return BraceLanguage(
+        re.compile("|".join((_COMMENTS,) + tokens)), re.compile(decl) if decl else None
+    )
+
+
+_JS = _brace_language(_JS_TEMPLATE, _DQ_STRING, _SQ_STRING, _JS_REGEX, decl=_JS_DECL)
+_C = _brace_language(_DQ_STRING, _SQ_STRING, _PREPROCESSOR)
+_JVM = _brace_language(_TRIPLE_STRING, _DQ_STRING, _SQ_STRING)
+
+BRACE_LANGUAGES: dict[str, BraceLanguage] = {
+    "js": _JS,
+    "ts": _JS,
+    "go": _brace_language(_GO_RAW_STRING, _DQ_STRING, _SQ_STRING, decl=_GO_DECL),
+    "java": _JVM,
+    "scala": _JVM,
+    "groovy": _brace_language(_TRIPLE_STRING, r"'''[\s\S]*?'''", _DQ_STRING, _SQ_STRING),
+    "c": _C,
+    "h": _C,
+    "cpp": _C,
+    "hpp": _C,
+    "cs": _brace_language(
+        _CS_VERBATIM_STRING, _TRIPLE_STRING, _DQ_STRING, _SQ_STRING, _PREPROCESSOR
+    ),
+}
+
+_STRUCTURE = re.compile(r"[{}()\[\];]")
+_NOT_NEWLINE = re.compile(r"[^\n]")
+_ANNOTATION = re.compile(r"@[\w.]+(?:\s*\([^()]*(?:\([^()]*\)[^()]*)*\))?|(?m:^\s*\[[^\]\n]*\])")
+_NAMESPACE = re.compile(r"\b(?:namespace|module|package)\b[\w.\s]*$|\bextern\s*$")
+_GO_METHOD = re.compile(r"\bfunc\s*\(\s*(?:\w+\s+)?\*?\s*(\w+)[^)]*\)\s*(\w+)")
+_GO_TYPE = re.compile(r"\btype\s+(\w+)(?:\[[^\]]*\])?\s+(?:struct|interface)\b")
+_CONTAINER = re.compile(
+    r"\b(?:class|interface|struct|enum|trait|object|record|union)\s+([A-Za-z_$][\w$]*)"
+    r"\s*(?=$|[{:<(,]|\b(?:extends|implements|with|where|final|sealed|permits)\b)"
+)
+_NAMED_FUNCTION = re.compile(r"\b(?:function|func|def)\s*\*?\s*([A-Za-z_$][\w$]*)")
+_ARROW_FUNCTION = re.compile(
+    r"\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s+)?"
+    r"(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[A-Za-z_$][\w$]*\s*=>)"
+)
+_CALL = re.compile(r"([A-Za-z_$~][\w$~]*(?:::~?[\w$]+)*)\s*\(")
+_NOT_FUNCTIONS = {
+    "if", "for", "while", "switch", "catch", "return", "sizeof", "new", "else", "do", "try",
+    "synchronized", "using", "lock", "foreach", "fixed", "typeof", "function", "decltype",
+    "alignas", "__attribute__", "operator",
+}
+
+
+def _blank(match: re.Match) -> str:
+    return _NOT_NEWLINE.sub(" ", match.group())
+
+
+def _top_level_spans(masked: str, start: int, stop: int) -> list[tuple[int, int]] | None:
+    spans: list[tuple[int, int]] = []
+    depth = 0
+    for match in _STRUCTURE.finditer(masked, start, stop):
+        char = match.group()
+        if char in "{([":
+            depth += 1
+        elif char in "})]":
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0 and char == "}":
+                end = match.end()
+                tail = re.match(r"[ \t]*;", masked[end:stop])
+                if tail:
+                    end += tail.end()
+                if end > start:
+                    spans.append((start, end))
+                    start = end
+        elif char == ";" and depth == 0 and match.end() > start:
+            spans.append((start, match.end()))
+            start = match.end()
+    if depth:
+        return None
+    if start < stop:
+        spans.append((start, stop))
+    return spans
+
+
+def _block_open(masked: str, start: int, end: int) -> int:
+    depth = 0
+    for match in _STRUCTURE.finditer(masked, start, end):
+        char = match.group()
+        if char == "{" and depth == 0:
+            return match.start()
+        depth += 1 if char in "{([" else -1 if char in "})]" else 0
+    return -1
+
+
+def _classify(header: str) -> tuple[str, str, str | None] | None:
+    header = _ANNOTATION.sub(_blank, header).strip()
+    if _NAMESPACE.search(header):
+        return "namespace", "", None
+    match = _GO_METHOD.search(header)
+    if match:
+        return "func", match.group(2), match.group(1)
+    match = _GO_TYPE.search(header) or _CONTAINER.search(header)
+    if match:
+        return "class", match.group(1), None
+    match = _NAMED_FUNCTION.search(header) or _ARROW_FUNCTION.search(header)
+    if match:
+        return "func", match.group(1), None
+    for match in _CALL.finditer(header):
+        name = match.group(1)
+        if name in _NOT_FUNCTIONS or not header.rstrip().endswith(")") and "=" in header:
+            continue
+        if "::" in name:
+            owner, _, name = name.rpartition("::")
+            return "func", name, owner.replace("::", ".")
+        return "func", name, None
+    return None
+
+
+def _trim(text: str, start: int, end: int) -> tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _leading_comments(text: str, masked: str, start: int, decl: int) -> int:
+    line_start = max(start, text.rfind("\n", 0, decl) + 1)
+    if masked[line_start:decl].strip():
+        return decl
+    decl = line_start
+    while decl > start and text[decl - 1] == "\n":
+        prev_start = max(start, text.rfind("\n", 0, decl - 1) + 1)
+        if prev_start == start and start > 0 and text[start - 1] != "\n":
+            break
+        code = masked[prev_start : decl - 1].strip()
+        if not text[prev_start : decl - 1].strip() or (code and code[0] not in "@["):
+            break
+        decl = prev_start
+    return decl
+
+
+def chunk_braces(
+    code_text: str,
+    file_path: str,
+    language: str,
+    chunk_size: int = 1000,
+    overlap: int = 200,
+    snap_lines: bool = False,
+    lines: LineIndex | None = None,
+) -> list[Chunk] | None:
+    spec = BRACE_LANGUAGES.get(language)
+    if spec is None:
+        return None
+    lines = lines or LineIndex(code_text)
+    masked = spec.mask.sub(_blank, code_text)
+    spans = _top_level_spans(masked, 0, len(code_text))
+    if spans is None:
+        return None
+
+    max_size = chunk_size * 4
+    chunks: list[Chunk] = []
+    pending: tuple[int, int, list[str]] | None = None
+    has_symbols = False
+
+    def flush() -> None:
+        nonlocal pending
+        if pending is not None:
+            start, end, symbols = pending
+            chunks.append(_make_chunk(lines, start, end, file_path, language, symbols))
+            pending = None
+
+    def emit(start: int, end: int, symbol: str | None) -> None:
+        nonlocal pending
+        start, end = _trim(code_text, start, end)
+        if not code_text[start:end].strip("{}; \t\r\n"):
+            return
+        symbols = [symbol] if symbol else []
+        if pending is not None and end - pending[0] <= chunk_size:
+            merged = pending[2] + [symbol for symbol in symbols if symbol not in pending[2]]
+            pending = (pending[0], end, merged)
+            return
+        flush()
+        if end - start <= chunk_size:
+            pending = (start, end, symbols)
+            return
+        if end - start <= max_size:
+            chunks.append(_make_chunk(lines, start, end, file_path, language, symbols))
+            return
+        chunks.extend(
+            _window_chunks(
+                lines, start, end, file_path, language, symbols, chunk_size, overlap, snap_lines
+            )
+        )
+
+    def walk(
+        spans: list[tuple[int, int]],
+        owner: str | None,
+        gap_symbol: str | None,
+        gap_start: int,
+        stop: int,
+    ) -> None:
+        nonlocal has_symbols
+        for start, end in spans:
+            brace = _block_open(masked, start, end)
+            if brace < 0 or masked[start:end].rstrip(" \t;")[-1:] != "}":
+                continue
+            decl = _trim(masked, start, brace)[0]
+            if spec.decl is not None:
+                for match in spec.decl.finditer(masked, start, brace):
+                    decl = match.start()
+            kind = _classify(masked[decl:brace])
+            if kind is None:
+                continue
+            kind_name, name, symbol_owner = kind
+            close = masked.rindex("}", brace, end)
+            inner = _top_level_spans(masked, brace + 1, close)
+
+            if kind_name == "namespace":
+                if inner:
+                    walk(inner, owner, gap_symbol, gap_start, end)
+                    gap_start = end
+                continue
+
+            decl = _leading_comments(code_text, masked, start, decl)
+            emit(gap_start, decl, gap_symbol)
+            gap_start = end
+            has_symbols = True
+            if kind_name == "class":
+                qualified = f"{owner}.{name}" if owner else name
+                symbol = f"class:{qualified}"
+                if end - decl <= max_size or not inner:
+                    emit(decl, end, symbol)
+                else:
+                    walk(inner, qualified, symbol, decl, end)
+            elif symbol_owner or owner:
+                emit(decl, end, f"method:{symbol_owner or owner}.{name}")
+            else:
+                emit(decl, end, f"func:{name}")
+        emit(gap_start, stop, gap_symbol)
+
+    walk(spans, None, None, 0, len(code_text))
+    flush()
+    return chunks if has_symbols else None
+
+
 def chunk_code(
     code_text: str,
     file_path: str,
     language: str,
     chunk_size: int = 1000,
     overlap: int = 200,
+    snap_lines: bool = False,
 ) -> list[Chunk]:
+    lines = LineIndex(code_text)
     if language == "python":
-        chunks = chunk_python(code_text, file_path)
+        chunks = chunk_python(code_text, file_path, lines)
+        if chunks:
+            return chunks
+    elif language in BRACE_LANGUAGES:
+        chunks = chunk_braces(
+            code_text, file_path, language, chunk_size, overlap, snap_lines, lines
+        )
         if chunks:
             return chunks
-        return sliding_window_chunks(code_text, file_path, language, chunk_size, overlap)
 
-    return sliding_window_chunks(code_text, file_path, language, chunk_size, overlap)
+    return sliding_window_chunks(
+        code_text, file_path, language, chunk_size, overlap, snap_lines, lines
+    )
@@ -0,0 +1,119 @@
+from dataclasses import dataclass, field
+from typing import Iterable, Protocol
+
+from app.services.embeddings import estimate_tokens
+
+
+class RetrievedChunk(Protocol):
+    path: str
+    start_line: int
+    end_line: int
+    content: str
+
+
+@dataclass
+class ContextBlock:
+    path: str
+    start_line: int
+    end_line: int
+    rank: int
+    repo_id: str | None = None
+    repo: str | None = None
+    lines: dict[int, str] = field(default_factory=dict)
+
+    @property
+    def location(self) -> str:
+        return f"{self.repo}/{self.path}" if self.repo else self.path
+
+    def add(self, chunk: RetrievedChunk, rank: int) -> None:
+        self.start_line = min(self.start_line, chunk.start_line)
+        self.end_line = max(self.end_line, chunk.end_line)
+        self.rank = min(self.rank, rank)
+        count = chunk.end_line - chunk.start_line + 1
+        for offset, line in enumerate(chunk.content.split("\n")[:count]):
+            line_no = chunk.start_line + offset
+            if len(line) > len(self.lines.get(line_no, "")):
+                self.lines[line_no] = line
+
+    def text(self, end_line: int | None = None) -> str:
+        stop = self.end_line if end_line is None else end_line
+        return "\n".join(self.lines.get(n, "") for n in range(self.start_line, stop + 1))
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    sources: list[dict]
+    tokens: int
+
+
+def merge_chunks(chunks: Iterable[RetrievedChunk]) -> list[ContextBlock]:
+    by_path: dict[tuple, list[tuple[int, RetrievedChunk]]] = {}
+    for rank, chunk in enumerate(chunks):
+        repo_id = getattr(chunk, "repo_id", None)
+        key = (str(repo_id) if repo_id else None, getattr(chunk, "repo", None), chunk.path)
+        by_path.setdefault(key, []).append((rank, chunk))
+
+    blocks: list[ContextBlock] = []
+    for (repo_id, repo, path), ranked in by_path.items():
+        ranked.sort(key=lambda item: (item[1].start_line, -item[1].end_line))
+        current = None
+        for rank, chunk in ranked:
+            if current is None or chunk.start_line > current.end_line + 1:
+                current = ContextBlock(
+                    path, chunk.start_line, chunk.end_line, rank, repo_id, repo
+                )
+                blocks.append(current)
+            current.add(chunk, rank)
+    blocks.sort(key=lambda block: block.rank)
+    return blocks
+
+
+def _entry(block: ContextBlock, index: int, end_line: int) -> str:
+    label = f"[{index}] {block.location}:{block.start_line}-{end_line}"
+    return f"{label}\n{block.text(end_line)}"
+
+
+def _fit(block: ContextBlock, budget: int) -> tuple[int, str] | None:
+    # Cost grows with end_line, so search for the longest prefix whose text fits.
+    best = None
+    low, high = block.start_line, block.end_line
+    while low <= high:
+        end_line = (low + high) // 2
+        entry = _entry(block, 1, end_line)
+        if estimate_tokens(entry) <= budget:
+            best = end_line, entry
+            low = end_line + 1
+        else:
+            high = end_line - 1
+    return best
+
+
+def build_context(chunks: Iterable[RetrievedChunk], token_budget: int) -> AssembledContext:
+    assembled = ""
+    sources: list[dict] = []
+    seen: set[str] = set()
+    for block in merge_chunks(chunks):
+        full_text = block.text()
+        if full_text in seen:
+            continue
+        seen.add(full_text)
+
+        end_line = block.end_line
+        entry = _entry(block, len(sources) + 1, end_line)
+        candidate = f"{assembled}\n\n{entry}" if sources else entry
+        if estimate_tokens(candidate) > token_budget:
+            if sources:
+                continue
+            fitted = _fit(block, token_budget)
+            if fitted is None:
+                break
+            end_line, candidate = fitted
+
+        assembled = candidate
+        source = {"path": block.path, "start_line": block.start_line, "end_line": end_line}
+        if block.repo_id:
+            source = {"repo_id": block.repo_id, "repo": block.repo, **source}
+        sources.append(source)
+
+    return AssembledContext(assembled, sources, estimate_tokens(assembled) if sources else 0)
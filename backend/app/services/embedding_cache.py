@@ -0,0 +1,135 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from openai import OpenAI
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import EmbeddingCacheEntry
+from app.services.embeddings import embed_batched
+
+
+LOOKUP_BATCH = 1000
+EVICT_BATCH_ROWS = 10000
+
+
+def content_hash(text_value: str) -> str:
+    return hashlib.sha256(text_value.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def lookup_embeddings(session: Session, hashes: list[str]) -> dict[str, list[float]]:
+    found: dict[str, list[float]] = {}
+    for i in range(0, len(hashes), LOOKUP_BATCH):
+        batch = hashes[i : i + LOOKUP_BATCH]
+        rows = session.execute(
+            select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding).where(
+                EmbeddingCacheEntry.model == settings.embedding_model,
+                EmbeddingCacheEntry.dim == settings.embedding_dim,
+                EmbeddingCacheEntry.content_hash.in_(batch),
+            )
+        ).all()
+        found.update({row.content_hash: row.embedding for row in rows})
+        hit_hashes = [row.content_hash for row in rows]
+        if hit_hashes:
+            session.execute(
+                update(EmbeddingCacheEntry)
+                .where(
+                    EmbeddingCacheEntry.model == settings.embedding_model,
+                    EmbeddingCacheEntry.dim == settings.embedding_dim,
+                    EmbeddingCacheEntry.content_hash.in_(hit_hashes),
+                )
+                .values(last_used_at=func.now())
+            )
+    return found
+
+
+def store_embeddings(session: Session, entries: dict[str, list[float]]) -> None:
+    items = list(entries.items())
+    for i in range(0, len(items), LOOKUP_BATCH):
+        rows = [
+            {
+                "model": settings.embedding_model,
+                "dim": settings.embedding_dim,
+                "content_hash": digest,
+                "embedding": embedding,
+            }
+            for digest, embedding in items[i : i + LOOKUP_BATCH]
+        ]
+        session.execute(insert(EmbeddingCacheEntry).values(rows).on_conflict_do_nothing())
+
+
+def embed_with_cache(session: Session, client: OpenAI, texts: list[str]) -> list[list[float]]:
+    if not settings.embedding_cache_enabled:
+        return embed_batched(client, texts)
+
+    hashes = [content_hash(t) for t in texts]
+    unique_hashes = list(dict.fromkeys(hashes))
+    cached = lookup_embeddings(session, unique_hashes)
+
+    missing: dict[str, str] = {}
+    for digest, text_value in zip(hashes, texts):
+        if digest not in cached and digest not in missing:
+            missing[digest] = text_value
+
+    if missing:
+        fresh = embed_batched(client, list(missing.values()))
+        new_entries = dict(zip(missing.keys(), fresh))
+        store_embeddings(session, new_entries)
+        cached.update(new_entries)
+
+    return [cached[digest] for digest in hashes]
+
+
+def _delete_oldest(session: Session, limit: int, cutoff: datetime | None = None) -> int:
+    result = session.execute(
+        text(
+            f"""
+            DELETE FROM embedding_cache
+            WHERE (model, dim, content_hash) IN (
+                SELECT model, dim, content_hash
+                FROM embedding_cache
+                {"WHERE last_used_at < :cutoff" if cutoff else ""}
+                ORDER BY last_used_at
+                LIMIT :limit
+            )
+            """
+        ),
+        {"limit": limit, "cutoff": cutoff},
+    )
+    session.commit()
+    return result.rowcount or 0
+
+
+def _cache_rows(session: Session) -> int:
+    # The planner estimate is enough to skip the exact count while the cache is under its cap.
+    estimate = session.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'embedding_cache'::regclass")
+    ).scalar_one()
+    if 0 <= estimate <= settings.embedding_cache_max_rows * 0.9:
+        return estimate
+    return session.execute(text("SELECT count(*) FROM embedding_cache")).scalar_one()
+
+
+def evict_embedding_cache(session: Session) -> int:
+    removed = 0
+    if settings.embedding_cache_max_age_days > 0:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.embedding_cache_max_age_days)
+        while True:
+            deleted = _delete_oldest(session, EVICT_BATCH_ROWS, cutoff)
+            removed += deleted
+            if deleted < EVICT_BATCH_ROWS:
+                break
+
+    if settings.embedding_cache_max_rows > 0:
+        excess = _cache_rows(session) - settings.embedding_cache_max_rows
+        while excess > 0:
+            deleted = _delete_oldest(session, min(excess, EVICT_BATCH_ROWS))
+            removed += deleted
+            excess -= deleted
+            if not deleted:
+                break
+
+    session.commit()
+    return removed
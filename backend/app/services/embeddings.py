@@ -0,0 +1,139 @@
+import contextvars
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from openai import APIConnectionError, APIStatusError, OpenAI, RateLimitError
+
+from app.config import settings
+from app.services.metrics import EMBEDDING_RETRIES, record_embedding_usage, timed
+from app.services.openai_client import embedding_options
+from app.services.rate_limiter import embedding_rate_limiter, parse_duration
+
+RETRYABLE_STATUS_CODES = {408, 409}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _retry_after(headers) -> float | None:
+    retry_after_ms = parse_duration(headers.get("retry-after-ms"))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    return parse_duration(headers.get("retry-after")) or parse_duration(
+        headers.get("x-ratelimit-reset-requests")
+    )
+
+
+def _backoff_seconds(attempt: int, retry_after: float | None) -> float:
+    ceiling = min(
+        settings.embedding_retry_max_seconds,
+        settings.embedding_retry_base_seconds * 2**attempt,
+    )
+    return max(random.uniform(0, ceiling), retry_after or 0)
+
+
+def _is_oversized(exc: APIStatusError) -> bool:
+    if exc.status_code == 413:
+        return True
+    message = str(exc).lower()
+    return exc.status_code == 400 and any(
+        marker in message for marker in ("maximum context length", "too many", "too large")
+    )
+
+
+def _request_embeddings(client: OpenAI, texts: list[str], tokens: int):
+    attempt = 0
+    while True:
+        retry_after = None
+        with embedding_rate_limiter.slot(tokens):
+            try:
+                with timed("embed_batch"):
+                    raw = client.embeddings.with_raw_response.create(
+                        model=settings.embedding_model,
+                        input=texts,
+                        **embedding_options(),
+                    )
+            except RateLimitError as exc:
+                retry_after = _retry_after(exc.response.headers) or 1.0
+                embedding_rate_limiter.record_rate_limit(retry_after)
+                reason = "rate_limit"
+            except APIConnectionError:
+                reason = "connection"
+            except APIStatusError as exc:
+                if exc.status_code < 500 and exc.status_code not in RETRYABLE_STATUS_CODES:
+                    raise
+                retry_after = _retry_after(exc.response.headers)
+                reason = "server_error"
+            else:
+                embedding_rate_limiter.record_success(raw.headers)
+                return raw.parse()
+
+        if attempt >= settings.embedding_max_retries:
+            raise HTTPException(status_code=502, detail="Embedding request failed after retries")
+        EMBEDDING_RETRIES.labels(reason).inc()
+        time.sleep(_backoff_seconds(attempt, retry_after))
+        attempt += 1
+
+
+def _embed_texts(client: OpenAI, texts: list[str]) -> list[list[float]]:
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY is required")
+    if not texts:
+        return []
+    tokens = sum(estimate_tokens(text) for text in texts)
+    try:
+        response = _request_embeddings(client, texts, tokens)
+    except APIStatusError as exc:
+        if len(texts) < 2 or not _is_oversized(exc):
+            raise
+        EMBEDDING_RETRIES.labels("split").inc()
+        middle = len(texts) // 2
+        return _embed_texts(client, texts[:middle]) + _embed_texts(client, texts[middle:])
+    record_embedding_usage("index", response, len(texts), tokens)
+    data = sorted(response.data, key=lambda item: item.index)
+    return [item.embedding for item in data]
+
+
+def plan_batches(texts: list[str], max_inputs: int, max_tokens: int) -> list[list[int]]:
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_inputs or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_batched(client: OpenAI, texts: list[str]) -> list[list[float]]:
+    batches = plan_batches(
+        texts,
+        max_inputs=settings.embedding_batch_size,
+        max_tokens=settings.embedding_batch_tokens,
+    )
+    if not batches:
+        return []
+
+    embeddings: list[list[float] | None] = [None] * len(texts)
+    workers = max(1, min(settings.embedding_max_concurrency, len(batches)))
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            lambda batch: context.copy().run(_embed_texts, client, [texts[i] for i in batch]),
+            batches,
+        )
+        for batch, batch_embeddings in zip(batches, results):
+            if len(batch_embeddings) != len(batch):
+                raise HTTPException(status_code=502, detail="Embedding response size mismatch")
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+    return embeddings
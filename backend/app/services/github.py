@@ -2,11 +2,14 @@ import re
 import subprocess
 import tempfile
 from dataclasses import dataclass
+from typing import Iterable, Iterator, TypeVar
 
 import httpx
 from fastapi import HTTPException
 
 
+K = TypeVar("K")
+
 GITHUB_REPO_RE = re.compile(r"^https://github\.com/([A-Za-z0-9_.-]+)/([A-Za-z0-9_.-]+)\/?$")
 
 
@@ -41,10 +44,75 @@ def validate_github_url(url: str) -> GithubRepo:
     return GithubRepo(owner=owner, repo=repo, url=normalized)
 
 
-def shallow_clone(repo_url: str) -> str:
+def shallow_clone(repo_url: str, max_blob_bytes: int | None = None) -> str:
     temp_dir = tempfile.mkdtemp(prefix="repo_")
-    cmd = ["git", "clone", "--depth", "1", repo_url, temp_dir]
+    cmd = ["git", "clone", "--depth", "1"]
+    if max_blob_bytes is not None:
+        cmd += ["--no-checkout", f"--filter=blob:limit={max_blob_bytes + 1}"]
+    cmd += [repo_url, temp_dir]
     result = subprocess.run(cmd, capture_output=True, text=True)
     if result.returncode != 0:
         raise HTTPException(status_code=400, detail=f"Git clone failed: {result.stderr.strip()}")
     return temp_dir
+
+
+def list_blob_shas(repo_path: str) -> dict[str, str]:
+    cmd = ["git", "-C", repo_path, "ls-tree", "-r", "-z", "HEAD"]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {}
+
+    shas: dict[str, str] = {}
+    for entry in result.stdout.split("\0"):
+        if not entry:
+            continue
+        meta, _, path = entry.partition("\t")
+        parts = meta.split()
+        if len(parts) == 3 and parts[1] == "blob":
+            shas[path] = parts[2]
+    return shas
+
+
+def list_blob_sizes(repo_path: str) -> dict[str, int]:
+    cmd = [
+        "git",
+        "-C",
+        repo_path,
+        "cat-file",
+        "--batch-check=%(objectname) %(objecttype) %(objectsize)",
+        "--batch-all-objects",
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {}
+
+    sizes: dict[str, int] = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[1] == "blob":
+            sizes[parts[0]] = int(parts[2])
+    return sizes
+
+
+def read_blobs(repo_path: str, items: Iterable[tuple[K, str]]) -> Iterator[tuple[K, bytes | None]]:
+    process = subprocess.Popen(
+        ["git", "-C", repo_path, "cat-file", "--batch"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        for key, sha in items:
+            process.stdin.write(f"{sha}\n".encode())
+            process.stdin.flush()
+            header = process.stdout.readline().split()
+            if len(header) != 3:
+                yield key, None
+                continue
+            data = process.stdout.read(int(header[2]))
+            process.stdout.read(1)
+            yield key, data
+    finally:
+        process.stdin.close()
+        process.stdout.close()
+        process.wait()
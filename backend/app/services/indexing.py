@@ -1,16 +1,36 @@
+import multiprocessing
 import os
 import shutil
-from typing import Iterable
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Iterable, Iterator
 
 from fastapi import HTTPException
 from openai import OpenAI
-from sqlalchemy import delete
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.models import Chunk, Repo
-from app.services.chunker import chunk_code
-from app.services.github import shallow_clone, validate_github_url
+from app.models import Chunk, ChunkSymbol, Repo, RepoFile
+from app.services.chunker import Chunk as ChunkData
+from app.services.chunker import chunk_code, parse_symbol
+from app.services.chunk_writer import write_chunks, write_symbols
+from app.services.embedding_cache import content_hash, embed_with_cache, evict_embedding_cache
+from app.services.github import (
+    list_blob_shas,
+    list_blob_sizes,
+    read_blobs,
+    shallow_clone,
+    validate_github_url,
+)
+from app.services.metrics import CHUNKS_WRITTEN, FILES_CHUNKED, observe, timed
+from app.services.openai_client import get_openai_client
+from app.services.partitions import ensure_repo_partition, ensure_vector_index
+from app.services.pipeline import Stage, bounded_map
 
 
 INCLUDE_EXTS = {
@@ -66,13 +86,19 @@ INCLUDE_EXTS = {
 EXCLUDE_DIRS = {"node_modules", "dist", "build", ".git", "__pycache__", ".next"}
 MAX_FILE_BYTES = 1_000_000
 
+_chunk_executor: ProcessPoolExecutor | None = None
+
+
+def _is_included(name: str) -> bool:
+    _, ext = os.path.splitext(name)
+    return ext.lower() in INCLUDE_EXTS
+
 
 def _iter_files(root: str) -> Iterable[str]:
     for dirpath, dirnames, filenames in os.walk(root):
         dirnames[:] = [d for d in dirnames if d not in EXCLUDE_DIRS]
         for name in filenames:
-            _, ext = os.path.splitext(name)
-            if ext.lower() not in INCLUDE_EXTS:
+            if not _is_included(name):
                 continue
             path = os.path.join(dirpath, name)
             try:
@@ -80,22 +106,17 @@ def _iter_files(root: str) -> Iterable[str]:
                     continue
             except OSError:
                 continue
-            yield path
-
+            yield os.path.relpath(path, root).replace("\\", "/")
 
-def _chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200):
-    step = max(1, chunk_size - overlap)
-    for start in range(0, len(text), step):
-        end = min(len(text), start + chunk_size)
-        yield start, end, text[start:end]
-        if end >= len(text):
-            break
 
-
-def _line_range(text: str, start: int, end: int) -> tuple[int, int]:
-    start_line = 1 + text[:start].count("\n")
-    end_line = 1 + text[:end].count("\n")
-    return start_line, end_line
+def _iter_blobs(blob_shas: dict[str, str], blob_sizes: dict[str, int]) -> Iterable[str]:
+    for path, sha in blob_shas.items():
+        *dirs, name = path.split("/")
+        if EXCLUDE_DIRS.intersection(dirs) or not _is_included(name):
+            continue
+        if blob_sizes.get(sha, MAX_FILE_BYTES + 1) > MAX_FILE_BYTES:
+            continue
+        yield path
 
 
 def _language_from_path(path: str) -> str:
@@ -106,16 +127,251 @@ def _language_from_path(path: str) -> str:
     return ext or "text"
 
 
-def _embed_texts(client: OpenAI, texts: list[str]) -> list[list[float]]:
-    if not settings.openai_api_key:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY is required")
-    if not texts:
-        return []
-    response = client.embeddings.create(model=settings.embedding_model, input=texts)
-    return [item.embedding for item in response.data]
+@dataclass
+class IndexResult:
+    files_indexed: int = 0
+    chunks_indexed: int = 0
+    files_added: int = 0
+    files_modified: int = 0
+    files_deleted: int = 0
+    files_unchanged: int = 0
+
+
+@dataclass
+class IndexProgress:
+    stage: str = "queued"
+    files_total: int = 0
+    files_processed: int = 0
+    chunks_processed: int = 0
+
+
+@dataclass
+class ManifestEntry:
+    content_hash: str
+    chunk_ids: list[uuid.UUID]
+
+
+@dataclass
+class PendingFile:
+    path: str
+    content_hash: str
+    previous: ManifestEntry | None
+    chunks: list[ChunkData]
+    content: str
+
+
+def _delete_chunks(session: Session, repo: Repo, chunk_ids: list[uuid.UUID]) -> None:
+    if chunk_ids:
+        session.execute(
+            delete(ChunkSymbol).where(
+                ChunkSymbol.repo_id == repo.id, ChunkSymbol.chunk_id.in_(chunk_ids)
+            )
+        )
+        session.execute(delete(Chunk).where(Chunk.repo_id == repo.id, Chunk.id.in_(chunk_ids)))
+
+
+def _get_chunk_executor() -> ProcessPoolExecutor | None:
+    global _chunk_executor
+    if settings.chunk_workers <= 1:
+        return None
+    if _chunk_executor is None:
+        _chunk_executor = ProcessPoolExecutor(
+            max_workers=settings.chunk_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _chunk_executor
+
+
+def _reset_chunk_executor() -> None:
+    global _chunk_executor
+    if _chunk_executor is not None:
+        _chunk_executor.shutdown(wait=False, cancel_futures=True)
+        _chunk_executor = None
+
+
+def _load_and_chunk(
+    file_path: str, rel_path: str, needs_hash: bool
+) -> tuple[str | None, list[ChunkData], float, str] | None:
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+    except OSError:
+        return None
+    return _chunk_content(content, rel_path, needs_hash)
+
+
+def _chunk_blob(
+    data: bytes | None, rel_path: str, needs_hash: bool
+) -> tuple[str | None, list[ChunkData], float, str] | None:
+    if data is None:
+        return None
+    content = data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+    return _chunk_content(content, rel_path, needs_hash)
+
+
+def _chunk_content(
+    content: str, rel_path: str, needs_hash: bool
+) -> tuple[str | None, list[ChunkData], float, str]:
+    start = time.perf_counter()
+    file_hash = content_hash(content) if needs_hash else None
+    language = _language_from_path(rel_path)
+    file_chunks = chunk_code(
+        content,
+        rel_path,
+        language,
+        chunk_size=1000,
+        overlap=200,
+        snap_lines=settings.chunk_snap_lines,
+    )
+    return file_hash, file_chunks, time.perf_counter() - start, content
+
+
+def _embed_files(
+    session: Session, client: OpenAI, pending: list[PendingFile]
+) -> tuple[list[PendingFile], list[list[float]]]:
+    texts = [chunk["content"] for pending_file in pending for chunk in pending_file.chunks]
+    embeddings = embed_with_cache(session, client, texts)
+    session.commit()
+    return pending, embeddings
+
+
+def _write_files(
+    session: Session, repo: Repo, pending: list[PendingFile], embeddings: list[list[float]]
+) -> int:
+    embedding_iter = iter(embeddings)
+    rows = []
+    symbol_rows = []
+    for pending_file in pending:
+        if pending_file.previous is not None:
+            _delete_chunks(session, repo, pending_file.previous.chunk_ids)
 
+        chunk_ids = []
+        for chunk_data in pending_file.chunks:
+            chunk_id = uuid.uuid4()
+            rows.append(
+                {
+                    "id": chunk_id,
+                    "repo_id": repo.id,
+                    "path": chunk_data["file_path"],
+                    "language": chunk_data["language"],
+                    "start_line": chunk_data["start_line"],
+                    "end_line": chunk_data["end_line"],
+                    "start_offset": chunk_data["start_offset"],
+                    "end_offset": chunk_data["end_offset"],
+                    "embedding": next(embedding_iter),
+                    "search_text": f"{chunk_data['file_path']} {chunk_data['content']}",
+                }
+            )
+            chunk_ids.append(chunk_id)
+            for symbol in chunk_data["symbols"]:
+                kind, qualified_name, name = parse_symbol(symbol)
+                symbol_rows.append(
+                    {
+                        "repo_id": repo.id,
+                        "chunk_id": chunk_id,
+                        "kind": kind,
+                        "qualified_name": qualified_name,
+                        "name": name,
+                    }
+                )
+
+        session.execute(
+            insert(RepoFile)
+            .values(
+                repo_id=repo.id,
+                path=pending_file.path,
+                content_hash=pending_file.content_hash,
+                chunk_ids=chunk_ids,
+                content=pending_file.content,
+            )
+            .on_conflict_do_update(
+                index_elements=[RepoFile.repo_id, RepoFile.path],
+                set_={
+                    "content_hash": pending_file.content_hash,
+                    "chunk_ids": chunk_ids,
+                    "content": pending_file.content,
+                    "indexed_at": func.now(),
+                },
+            )
+        )
+
+    write_chunks(session, rows)
+    write_symbols(session, symbol_rows)
+    return len(rows)
+
+
+def _load_tasks(repo_path: str, rel_paths: Iterable[str], blob_shas: dict[str, str]):
+    if settings.ingest_mode == "blobs":
+        blobs = read_blobs(repo_path, ((rel_path, blob_shas[rel_path]) for rel_path in rel_paths))
+        for rel_path, data in blobs:
+            yield data, rel_path, False
+    else:
+        for rel_path in rel_paths:
+            yield os.path.join(repo_path, rel_path), rel_path, rel_path not in blob_shas
+
+
+def _chunk_files(
+    repo_path: str,
+    rel_paths: list[str],
+    blob_shas: dict[str, str],
+    manifest: dict[str, ManifestEntry],
+    executor: ProcessPoolExecutor | None,
+    result: IndexResult,
+    progress: IndexProgress,
+) -> Iterator[list[PendingFile]]:
+    def changed_files():
+        for rel_path in rel_paths:
+            previous = manifest.get(rel_path)
+            if previous is not None and blob_shas.get(rel_path) == previous.content_hash:
+                progress.files_processed += 1
+                result.files_unchanged += 1
+                continue
+            yield rel_path
+
+    flush_size = settings.embedding_batch_size * max(1, settings.embedding_concurrency)
+    in_flight = max(1, settings.chunk_workers) * 4
+    batch: list[PendingFile] = []
+    batch_chunks = 0
+    load = _chunk_blob if settings.ingest_mode == "blobs" else _load_and_chunk
+    tasks = _load_tasks(repo_path, changed_files(), blob_shas)
+    for (_, rel_path, _), loaded in bounded_map(executor, load, tasks, in_flight):
+        progress.files_processed += 1
+        if loaded is None:
+            continue
+
+        previous = manifest.get(rel_path)
+        file_hash = blob_shas.get(rel_path) or loaded[0]
+        if previous is not None and file_hash == previous.content_hash:
+            result.files_unchanged += 1
+            continue
+
+        file_chunks = loaded[1]
+        observe("chunk", loaded[2])
+        FILES_CHUNKED.inc()
+        batch.append(PendingFile(rel_path, file_hash, previous, file_chunks, loaded[3]))
+        batch_chunks += len(file_chunks)
+        if previous is None:
+            result.files_added += 1
+        else:
+            result.files_modified += 1
+        if file_chunks:
+            result.files_indexed += 1
+
+        if batch_chunks >= flush_size:
+            yield batch
+            batch = []
+            batch_chunks = 0
 
-def index_repo(session: Session, repo: Repo, github_url: str | None):
+    if batch:
+        yield batch
+
+
+def index_repo(
+    session: Session,
+    repo: Repo,
+    github_url: str | None,
+    progress: IndexProgress | None = None,
+) -> IndexResult:
     if github_url:
         repo_info = validate_github_url(github_url)
         repo.github_url = repo_info.url
@@ -125,59 +381,104 @@ def index_repo(session: Session, repo: Repo, github_url: str | None):
         raise HTTPException(status_code=400, detail="github_url is required")
 
     repo_path = None
-    files_indexed = 0
-    chunks_indexed = 0
-    client = OpenAI(api_key=settings.openai_api_key)
+    result = IndexResult()
+    progress = progress or IndexProgress()
+    client = get_openai_client()
+    embed_session = None
+    stages: list[Stage] = []
 
     try:
         repo.status = "processing"
+        repo.index_version = Repo.index_version + 1
         session.commit()
-        repo_path = shallow_clone(repo.github_url)
-        session.execute(delete(Chunk).where(Chunk.repo_id == repo.id))
-        session.commit()
+        ensure_repo_partition(session, repo.id)
+        progress.stage = "cloning"
+        blobs = settings.ingest_mode == "blobs"
+        with timed("clone"):
+            repo_path = shallow_clone(repo.github_url, MAX_FILE_BYTES if blobs else None)
 
-        for file_path in _iter_files(repo_path):
-            rel_path = os.path.relpath(file_path, repo_path)
-            try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    content = f.read()
-            except OSError:
-                continue
+        progress.stage = "scanning"
+        with timed("scan"):
+            blob_shas = list_blob_shas(repo_path)
+            if blobs:
+                rel_paths = list(_iter_blobs(blob_shas, list_blob_sizes(repo_path)))
+            else:
+                rel_paths = list(_iter_files(repo_path))
+        progress.files_total = len(rel_paths)
 
-            language = _language_from_path(rel_path)
-            file_chunks = chunk_code(
-                content,
-                rel_path.replace("\\", "/"),
-                language,
-                chunk_size=1000,
-                overlap=200,
+        manifest = {
+            row.path: ManifestEntry(row.content_hash, row.chunk_ids)
+            for row in session.execute(
+                select(RepoFile.path, RepoFile.content_hash, RepoFile.chunk_ids).where(
+                    RepoFile.repo_id == repo.id
+                )
             )
+        }
+        if not manifest:
+            session.execute(delete(ChunkSymbol).where(ChunkSymbol.repo_id == repo.id))
+            session.execute(delete(Chunk).where(Chunk.repo_id == repo.id))
+            session.commit()
 
-            if not file_chunks:
-                continue
+        progress.stage = "indexing"
+        executor = _get_chunk_executor()
+        embed_session = Session(bind=session.get_bind())
+        depth = settings.pipeline_queue_depth
+        chunk_stage = Stage(
+            _chunk_files(repo_path, rel_paths, blob_shas, manifest, executor, result, progress),
+            depth,
+            name="chunk",
+        )
+        embed_stage = Stage(
+            (_embed_files(embed_session, client, batch) for batch in chunk_stage),
+            depth,
+            name="embed",
+        )
+        stages = [chunk_stage, embed_stage]
 
-            embeddings = _embed_texts(client, [c["content"] for c in file_chunks])
-            for chunk_data, embedding in zip(file_chunks, embeddings):
-                session.add(
-                    Chunk(
-                        repo_id=repo.id,
-                        path=chunk_data["file_path"],
-                        language=chunk_data["language"],
-                        start_line=chunk_data["start_line"],
-                        end_line=chunk_data["end_line"],
-                        content=chunk_data["content"],
-                        embedding=embedding,
-                    )
-                )
-                chunks_indexed += 1
+        uncommitted_chunks = 0
+        for batch, embeddings in embed_stage:
+            with timed("db_write"):
+                written = _write_files(session, repo, batch, embeddings)
+            CHUNKS_WRITTEN.inc(written)
+            result.chunks_indexed += written
+            progress.chunks_processed = result.chunks_indexed
+            uncommitted_chunks += written
+            if uncommitted_chunks >= settings.chunk_commit_interval:
+                with timed("db_commit"):
+                    session.commit()
+                uncommitted_chunks = 0
 
-            session.commit()
-            files_indexed += 1
+        progress.stage = "cleanup"
+        seen_paths = set(rel_paths)
+        deleted_paths = [path for path in manifest if path not in seen_paths]
+        for path in deleted_paths:
+            _delete_chunks(session, repo, manifest[path].chunk_ids)
+        if deleted_paths:
+            session.execute(
+                delete(RepoFile).where(
+                    RepoFile.repo_id == repo.id, RepoFile.path.in_(deleted_paths)
+                )
+            )
+        result.files_deleted = len(deleted_paths)
+        session.commit()
 
+        progress.stage = "vector_index"
+        with timed("vector_index"):
+            ensure_vector_index(session, repo.id)
         repo.status = "done"
+        repo.index_version = Repo.index_version + 1
         session.commit()
+        evict_embedding_cache(session)
+        progress.stage = "done"
+    except BrokenProcessPool:
+        _reset_chunk_executor()
+        raise
     finally:
+        for stage in stages:
+            stage.close()
+        if embed_session is not None:
+            embed_session.close()
         if repo_path:
             shutil.rmtree(repo_path, ignore_errors=True)
 
-    return files_indexed, chunks_indexed
+    return result
@@ -0,0 +1,248 @@
+import logging
+import threading
+import uuid
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import IndexJob, Repo
+from app.services.indexing import IndexProgress, IndexResult
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _active_job(session: Session, repo_id: uuid.UUID) -> IndexJob | None:
+    return session.execute(
+        select(IndexJob)
+        .where(IndexJob.repo_id == repo_id, IndexJob.status.in_(ACTIVE_STATUSES))
+        .order_by(IndexJob.created_at.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+
+
+def enqueue_index_job(session: Session, repo: Repo) -> IndexJob:
+    repo_id = repo.id
+    active = _active_job(session, repo_id)
+    if active:
+        return active
+
+    job = IndexJob(repo_id=repo_id, status="queued", stage="queued")
+    session.add(job)
+    repo.status = "queued"
+    try:
+        session.commit()
+    except IntegrityError:
+        # A concurrent request queued a job first; the partial unique index allows one.
+        session.rollback()
+        active = _active_job(session, repo_id)
+        if active is None:
+            raise
+        return active
+    session.refresh(job)
+    return job
+
+
+def latest_job(session: Session, repo_id: uuid.UUID) -> IndexJob | None:
+    return session.execute(
+        select(IndexJob)
+        .where(IndexJob.repo_id == repo_id)
+        .order_by(IndexJob.created_at.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+
+
+def _fail_abandoned_jobs(session: Session) -> None:
+    session.execute(
+        text(
+            """
+            WITH abandoned AS (
+                UPDATE index_jobs
+                SET status = 'failed',
+                    error = 'Worker stopped responding too many times',
+                    finished_at = now()
+                WHERE status = 'running'
+                  AND heartbeat_at < now() - make_interval(secs => :stale_seconds)
+                  AND attempts >= :max_attempts
+                RETURNING repo_id
+            )
+            UPDATE repos SET status = 'failed' WHERE id IN (SELECT repo_id FROM abandoned)
+            """
+        ),
+        {"stale_seconds": settings.job_stale_seconds, "max_attempts": settings.job_max_attempts},
+    )
+
+
+def claim_job(session: Session, worker_id: str) -> uuid.UUID | None:
+    _fail_abandoned_jobs(session)
+    job_id = session.execute(
+        text(
+            """
+            UPDATE index_jobs
+            SET status = 'running',
+                stage = 'starting',
+                worker_id = :worker_id,
+                attempts = attempts + 1,
+                started_at = now(),
+                heartbeat_at = now(),
+                files_processed = 0,
+                chunks_processed = 0
+            WHERE id = (
+                SELECT id FROM index_jobs AS candidate
+                WHERE (
+                    status = 'queued'
+                    OR (
+                        status = 'running'
+                        AND heartbeat_at < now() - make_interval(secs => :stale_seconds)
+                    )
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM index_jobs AS live
+                    WHERE live.repo_id = candidate.repo_id
+                      AND live.id <> candidate.id
+                      AND live.status = 'running'
+                      AND live.heartbeat_at >= now() - make_interval(secs => :stale_seconds)
+                )
+                ORDER BY created_at
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id
+            """
+        ),
+        {"worker_id": worker_id, "stale_seconds": settings.job_stale_seconds},
+    ).scalar_one_or_none()
+    session.commit()
+    return job_id
+
+
+def _update_owned_job(session: Session, job_id: uuid.UUID, worker_id: str, **values) -> bool:
+    result = session.execute(
+        update(IndexJob)
+        .where(
+            IndexJob.id == job_id,
+            IndexJob.worker_id == worker_id,
+            IndexJob.status == "running",
+        )
+        .values(**values)
+    )
+    return result.rowcount > 0
+
+
+def _progress_values(progress: IndexProgress) -> dict:
+    return {
+        "stage": progress.stage,
+        "files_total": progress.files_total,
+        "files_processed": progress.files_processed,
+        "chunks_processed": progress.chunks_processed,
+        "heartbeat_at": datetime.now(timezone.utc),
+    }
+
+
+class JobHeartbeat(threading.Thread):
+    def __init__(self, job_id: uuid.UUID, worker_id: str, progress: IndexProgress) -> None:
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.progress = progress
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(settings.job_heartbeat_seconds):
+            try:
+                with SessionLocal() as session:
+                    owned = _update_owned_job(
+                        session, self.job_id, self.worker_id, **_progress_values(self.progress)
+                    )
+                    session.commit()
+                if not owned:
+                    logger.warning(
+                        "job_heartbeat_lost job_id=%s worker_id=%s", self.job_id, self.worker_id
+                    )
+            except Exception:
+                logger.exception(
+                    "job_heartbeat_failed job_id=%s worker_id=%s", self.job_id, self.worker_id
+                )
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def complete_job(
+    session: Session,
+    job_id: uuid.UUID,
+    worker_id: str,
+    progress: IndexProgress,
+    result: IndexResult,
+) -> bool:
+    owned = _update_owned_job(
+        session,
+        job_id,
+        worker_id,
+        **_progress_values(progress)
+        | {
+            "status": "done",
+            "stage": "done",
+            "result": asdict(result),
+            "finished_at": datetime.now(timezone.utc),
+        },
+    )
+    session.commit()
+    return owned
+
+
+def fail_job(
+    session: Session,
+    job_id: uuid.UUID,
+    worker_id: str,
+    repo_id: uuid.UUID,
+    progress: IndexProgress,
+    error: str,
+) -> bool:
+    owned = _update_owned_job(
+        session,
+        job_id,
+        worker_id,
+        **_progress_values(progress),
+        status="failed",
+        error=error,
+        finished_at=datetime.now(timezone.utc),
+    )
+    if owned:
+        session.execute(update(Repo).where(Repo.id == repo_id).values(status="failed"))
+    session.commit()
+    return owned
+
+
+def job_metrics(job: IndexJob) -> dict[str, float | None]:
+    if not job.started_at:
+        return {
+            "elapsed_seconds": None,
+            "files_per_second": None,
+            "chunks_per_second": None,
+            "eta_seconds": None,
+        }
+
+    end = job.finished_at or datetime.now(timezone.utc)
+    elapsed = max((end - job.started_at).total_seconds(), 0.001)
+    files_rate = job.files_processed / elapsed
+    chunks_rate = job.chunks_processed / elapsed
+    eta = None
+    if job.status == "running" and job.files_total and files_rate > 0:
+        eta = max(job.files_total - job.files_processed, 0) / files_rate
+    elif job.status == "done":
+        eta = 0.0
+
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "files_per_second": round(files_rate, 3),
+        "chunks_per_second": round(chunks_rate, 3),
+        "eta_seconds": round(eta, 3) if eta is not None else None,
+    }
@@ -0,0 +1,123 @@
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, multiprocess
+from prometheus_client.exposition import choose_encoder
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TRACE_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+trace_id_var: ContextVar[str | None] = ContextVar("trace_id", default=None)
+
+STAGE_SECONDS = Histogram(
+    "codedoc_stage_duration_seconds",
+    "Duration of indexing and question-answering stages.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+HTTP_SECONDS = Histogram(
+    "codedoc_http_request_duration_seconds",
+    "HTTP request duration by route and status.",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS,
+)
+EMBEDDING_TOKENS = Counter(
+    "codedoc_embedding_tokens_total", "Tokens sent to the embedding model.", ["kind"]
+)
+EMBEDDING_INPUTS = Counter(
+    "codedoc_embedding_inputs_total", "Texts sent to the embedding model.", ["kind"]
+)
+EMBEDDING_RETRIES = Counter(
+    "codedoc_embedding_retries_total", "Retried or split embedding requests.", ["reason"]
+)
+LLM_TOKENS = Counter("codedoc_llm_tokens_total", "Chat completion tokens.", ["type"])
+FILES_CHUNKED = Counter("codedoc_files_chunked_total", "Files chunked during indexing.")
+CHUNKS_WRITTEN = Counter("codedoc_chunks_written_total", "Chunks written during indexing.")
+
+
+def current_trace_id() -> str | None:
+    return trace_id_var.get()
+
+
+def observe(stage: str, seconds: float) -> None:
+    trace_id = trace_id_var.get()
+    STAGE_SECONDS.labels(stage).observe(
+        seconds, exemplar={"trace_id": trace_id} if trace_id else None
+    )
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def record_embedding_usage(kind: str, response, inputs: int, estimated_tokens: int) -> None:
+    usage = getattr(response, "usage", None)
+    EMBEDDING_TOKENS.labels(kind).inc(getattr(usage, "total_tokens", None) or estimated_tokens)
+    EMBEDDING_INPUTS.labels(kind).inc(inputs)
+
+
+def record_llm_usage(response) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.labels("prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels("completion").inc(usage.completion_tokens or 0)
+
+
+def metrics_registry() -> CollectorRegistry:
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=path)
+    return registry
+
+
+def render_metrics(accept: str | None) -> tuple[bytes, str]:
+    encoder, content_type = choose_encoder(accept or "")
+    return encoder(metrics_registry()), content_type
+
+
+class TraceMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        requested = headers.get(b"x-request-id", b"").decode("latin-1")
+        trace_id = requested if TRACE_ID_RE.match(requested) else uuid.uuid4().hex
+        token = trace_id_var.set(trace_id)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-trace-id", trace_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start, exemplar={"trace_id": trace_id})
+            trace_id_var.reset(token)
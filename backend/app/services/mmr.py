@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _rescale(scores) -> np.ndarray:
+    scores = np.asarray(scores, dtype=np.float32)
+    spread = float(np.ptp(scores))
+    if spread <= 0:
+        return np.ones_like(scores)
+    return (scores - scores.min()) / spread
+
+
+def mmr_select(
+    query_embedding, candidates, top_k: int, mmr_lambda: float, scores=None
+) -> list[int]:
+    matrix = _normalize(np.asarray(candidates, dtype=np.float32))
+    count = len(matrix)
+    if count <= 1 or top_k <= 0:
+        return list(range(min(count, max(top_k, 0))))
+
+    if scores is None:
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        relevance = mmr_lambda * (matrix @ query)
+    else:
+        # Fused retrieval scores are rescaled to [0, 1] to stand in for query similarity.
+        relevance = mmr_lambda * _rescale(scores)
+    similarity = (1 - mmr_lambda) * (matrix @ matrix.T)
+    index = int(np.argmax(relevance))
+    selected = [index]
+    redundancy = similarity[index].copy()
+    available = np.ones(count, dtype=bool)
+    available[index] = False
+    while len(selected) < min(top_k, count):
+        scores = np.where(available, relevance - redundancy, -np.inf)
+        index = int(np.argmax(scores))
+        selected.append(index)
+        available[index] = False
+        np.maximum(redundancy, similarity[index], out=redundancy)
+    return selected
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.config import settings
+
+
+_client: OpenAI | None = None
+_client_lock = threading.Lock()
+_async_client: AsyncOpenAI | None = None
+_async_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.openai_max_connections,
+        max_keepalive_connections=settings.openai_max_keepalive_connections,
+        keepalive_expiry=settings.openai_keepalive_seconds,
+    )
+
+
+def embedding_options() -> dict:
+    if settings.embedding_dimensions:
+        return {"dimensions": settings.embedding_dimensions}
+    return {}
+
+
+def get_openai_client() -> OpenAI:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    limits=_limits(), timeout=settings.openai_timeout_seconds
+                )
+                _client = OpenAI(
+                    api_key=settings.openai_api_key,
+                    base_url=settings.openai_base_url,
+                    http_client=http_client,
+                    max_retries=0,
+                )
+    return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        http_client = httpx.AsyncClient(limits=_limits(), timeout=settings.openai_timeout_seconds)
+        _async_client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            http_client=http_client,
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_openai_client() -> None:
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+        _async_client_loop = None
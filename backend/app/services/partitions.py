@@ -0,0 +1,134 @@
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+
+def partition_name(repo_id: uuid.UUID) -> str:
+    return f"chunks_p_{repo_id.hex}"
+
+
+def vector_index_name(repo_id: uuid.UUID) -> str:
+    return f"ix_{partition_name(repo_id)}_embedding"
+
+
+def ensure_repo_partition(session: Session, repo_id: uuid.UUID) -> None:
+    exists = session.execute(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partition_name(repo_id)}
+    ).scalar()
+    if exists:
+        return
+    session.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(repo_id)} "
+            f"PARTITION OF chunks FOR VALUES IN ('{repo_id}')"
+        )
+    )
+    session.commit()
+
+
+def _row_count(session: Session, repo_id: uuid.UUID) -> int:
+    return session.execute(text(f"SELECT count(*) FROM {partition_name(repo_id)}")).scalar_one()
+
+
+def _ivfflat_lists(rows: int) -> int:
+    if settings.ivfflat_lists > 0:
+        return settings.ivfflat_lists
+    return max(1, min(4096, rows // 1000))
+
+
+def vector_index_target() -> str:
+    if settings.vector_index_quantization == "binary":
+        return f"(binary_quantize(embedding)::bit({settings.embedding_dim})) bit_hamming_ops"
+    return f"embedding {settings.embedding_storage}_l2_ops"
+
+
+def _existing_index(session: Session, index_name: str):
+    return session.execute(
+        text(
+            "SELECT am.amname, opc.opcname, c.reloptions, i.indisvalid, "
+            "obj_description(c.oid, 'pg_class') AS built_rows "
+            "FROM pg_class c JOIN pg_am am ON am.oid = c.relam "
+            "JOIN pg_index i ON i.indexrelid = c.oid "
+            "JOIN pg_opclass opc ON opc.oid = i.indclass[0] "
+            "WHERE c.oid = to_regclass(:name)"
+        ),
+        {"name": index_name},
+    ).one_or_none()
+
+
+def _matches(existing, options: dict[str, int] | None) -> bool:
+    return (
+        existing is not None
+        and existing.indisvalid
+        and existing.amname == settings.vector_index_type
+        and existing.opcname == vector_index_target().split()[-1]
+        and (
+            options is None
+            or sorted(existing.reloptions or []) == sorted(f"{k}={v}" for k, v in options.items())
+        )
+    )
+
+
+def _ivfflat_current(built_rows: str | None, rows: int) -> bool:
+    if not built_rows or not built_rows.isdigit():
+        return False
+    built = int(built_rows)
+    return abs(rows - built) <= settings.ivfflat_rebuild_ratio * max(built, 1)
+
+
+def ensure_vector_index(session: Session, repo_id: uuid.UUID) -> None:
+    index_name = vector_index_name(repo_id)
+    existing = _existing_index(session, index_name)
+    if settings.vector_index_type == "hnsw":
+        options = {"m": settings.hnsw_m, "ef_construction": settings.hnsw_ef_construction}
+        if _matches(existing, options):
+            return
+        rows = _row_count(session, repo_id)
+    else:
+        rows = _row_count(session, repo_id)
+        # IVFFlat centroids are fixed at build time, so rebuild once the row count has drifted.
+        options = {"lists": _ivfflat_lists(rows)}
+        fixed = options if settings.ivfflat_lists > 0 else None
+        if _matches(existing, fixed) and _ivfflat_current(existing.built_rows, rows):
+            return
+    session.commit()
+    _build_vector_index(session, repo_id, options, rows)
+
+
+def _build_vector_index(
+    session: Session, repo_id: uuid.UUID, options: dict[str, int], rows: int
+) -> None:
+    # Built concurrently under a temporary name and swapped in, so searches and writes on
+    # the partition are not blocked for the duration of the build.
+    index_name = vector_index_name(repo_id)
+    building = f"{index_name}_new"
+    with_options = ", ".join(f"{key} = {value}" for key, value in options.items())
+    with session.get_bind().connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {building}"))
+        connection.execute(
+            text(
+                f"CREATE INDEX CONCURRENTLY {building} ON {partition_name(repo_id)} "
+                f"USING {settings.vector_index_type} ({vector_index_target()}) "
+                f"WITH ({with_options})"
+            )
+        )
+        connection.execute(text(f"COMMENT ON INDEX {building} IS '{rows}'"))
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+        connection.execute(text(f"ALTER INDEX {building} RENAME TO {index_name}"))
+
+
+def set_search_params(session: Session, limit: int = 0) -> None:
+    if settings.vector_index_type == "hnsw":
+        session.execute(
+            text("SELECT set_config('hnsw.ef_search', :value, true)"),
+            {"value": str(max(settings.hnsw_ef_search, limit))},
+        )
+    else:
+        session.execute(
+            text("SELECT set_config('ivfflat.probes', :value, true)"),
+            {"value": str(settings.ivfflat_probes)},
+        )
@@ -0,0 +1,85 @@
+import contextvars
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class Stage(Iterator[T]):
+    def __init__(self, source: Iterable[T], depth: int, name: str = "stage") -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=context.run, args=(self._run, source), name=name, daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, source: Iterable[T]) -> None:
+        try:
+            for item in source:
+                if not self._put(item):
+                    return
+        except BaseException as exc:
+            self._error = exc
+        finally:
+            self._put(_DONE)
+
+    def __next__(self) -> T:
+        while True:
+            if self._stop.is_set():
+                raise StopIteration
+            try:
+                item = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        if item is _DONE:
+            self._stop.set()
+            if self._error is not None:
+                raise self._error
+            raise StopIteration
+        return item
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def bounded_map(
+    executor: Executor | None,
+    fn: Callable[..., R],
+    items: Iterable[tuple],
+    depth: int,
+) -> Iterator[tuple[tuple, R]]:
+    if executor is None:
+        for args in items:
+            yield args, fn(*args)
+        return
+
+    in_flight: deque = deque()
+    for args in items:
+        in_flight.append((args, executor.submit(fn, *args)))
+        if len(in_flight) >= depth:
+            args_done, future = in_flight.popleft()
+            yield args_done, future.result()
+    while in_flight:
+        args_done, future = in_flight.popleft()
+        yield args_done, future.result()
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.services.embedding_cache import content_hash, lookup_embeddings, store_embeddings
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> list[float] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, embedding = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return embedding
+
+    def put(self, key: tuple, embedding: list[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "shared": settings.query_cache_shared,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+query_cache = QueryEmbeddingCache(settings.query_cache_size, settings.query_cache_ttl_seconds)
+
+
+def _cache_key(text_value: str) -> tuple:
+    return (settings.embedding_model, settings.embedding_dim, text_value)
+
+
+async def cached_query_embeddings(
+    session: AsyncSession, questions: list[str], embed
+) -> list[list[float]]:
+    texts = [normalize_question(question) for question in questions]
+    found: dict[str, list[float]] = {}
+    for text_value in dict.fromkeys(texts):
+        embedding = query_cache.get(_cache_key(text_value))
+        if embedding is not None:
+            query_cache.record("hits")
+            found[text_value] = embedding
+    missing = {
+        content_hash(text_value): text_value for text_value in texts if text_value not in found
+    }
+
+    if missing and settings.query_cache_shared:
+        shared = await session.run_sync(lookup_embeddings, list(missing))
+        await session.commit()
+        for digest, embedding in shared.items():
+            query_cache.record("shared_hits")
+            text_value = missing.pop(digest)
+            found[text_value] = embedding
+            query_cache.put(_cache_key(text_value), embedding)
+
+    if missing:
+        for _ in missing:
+            query_cache.record("misses")
+        embeddings = await embed(list(missing.values()))
+        if settings.query_cache_shared:
+            await session.run_sync(store_embeddings, dict(zip(missing, embeddings)))
+            await session.commit()
+        for text_value, embedding in zip(missing.values(), embeddings):
+            found[text_value] = embedding
+            query_cache.put(_cache_key(text_value), embedding)
+    return [found[text_value] for text_value in texts]
+
+
+async def cached_query_embedding(session: AsyncSession, question: str, embed) -> list[float]:
+    return (await cached_query_embeddings(session, [question], embed))[0]
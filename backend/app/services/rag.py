@@ -1,14 +1,35 @@
+import asyncio
 import json
 import logging
+import re
+import time
 import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator
 
-from openai import OpenAI
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from openai import AsyncOpenAI
+from pgvector.utils import to_db
+from sqlalchemy import Integer, Text, and_, cast, func, literal, or_, select, true, union_all
+from sqlalchemy.dialects.postgresql import ARRAY, BIT, TSQUERY
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
-from app.models import Chunk, Repo
+from app.models import Chunk, ChunkSymbol, Repo
 from app.prompts import SYSTEM_PROMPT, user_prompt
+from app.services.context import build_context
+from app.services.embeddings import estimate_tokens
+from app.services.metrics import (
+    current_trace_id,
+    observe,
+    record_embedding_usage,
+    record_llm_usage,
+    timed,
+)
+from app.services.mmr import mmr_select
+from app.services.openai_client import embedding_options, get_async_openai_client
+from app.services.partitions import set_search_params
+from app.services.query_cache import cached_query_embedding, cached_query_embeddings
+from app.services.vector_store import RepoVectors, vector_store
 
 logger = logging.getLogger(__name__)
 if not logger.handlers:
@@ -17,20 +38,599 @@ if not logger.handlers:
     logger.addHandler(_handler)
 logger.setLevel(logging.INFO)
 
+_ANSWER_KEY = re.compile(r'"answer"\s*:\s*"')
+_HIGH_SURROGATE = re.compile(r"\\u[dD][89abAB]")
+_IDENTIFIER = re.compile(r"[A-Za-z_$][\w$]*(?:(?:\.|::)[A-Za-z_$][\w$]*)*")
+_CODE_LIKE = re.compile(r"_|\$|[a-z][A-Z]|::")
+_DOTTED_PATH = re.compile(r"[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)+")
+_ABBREVIATION = re.compile(r"[A-Za-z](?:\.[A-Za-z])+")
+_FILE_SUFFIX = re.compile(
+    r"\.(?:[cmt]?js|jsx|tsx?|py|go|rs|rb|java|kt|cs|c|h|cpp|hpp|php|swift|sh|md|rst|txt|json"
+    r"|ya?ml|toml|ini|cfg|lock|xml|html?|css|scss|sql|csv|log)$",
+    re.IGNORECASE,
+)
+_QUOTED = re.compile(r"`([^`]+)`")
+_SYMBOL_SEPARATOR = re.compile(r"\.|::")
+MAX_QUESTION_IDENTIFIERS = 8
 
-def _embed_query(client: OpenAI, text: str) -> list[float]:
-    response = client.embeddings.create(model=settings.embedding_model, input=[text])
-    return response.data[0].embedding
 
+_CHUNK_FIELDS = (Chunk.id, Chunk.path, Chunk.start_line, Chunk.end_line, Chunk.content)
+_REPO_LABEL = func.coalesce(Repo.name, cast(Repo.id, Text)).label("repo")
 
-def retrieve_chunks(session: Session, repo_id, query_embedding, top_k: int = 10):
+
+async def _embed_queries(client: AsyncOpenAI, texts: list[str]) -> list[list[float]]:
+    with timed("query_embedding"):
+        response = await client.embeddings.create(
+            model=settings.embedding_model,
+            input=texts,
+            **embedding_options(),
+        )
+    record_embedding_usage(
+        "query", response, len(texts), sum(estimate_tokens(text) for text in texts)
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+@dataclass
+class RetrievalOptions:
+    mode: str | None = None
+    vector_weight: float | None = None
+    text_weight: float | None = None
+    mmr: bool | None = None
+    mmr_lambda: float | None = None
+    mmr_pool_size: int | None = None
+
+
+def _use_mmr(options: RetrievalOptions) -> bool:
+    return settings.retrieval_mmr if options.mmr is None else options.mmr
+
+
+def _fetch_limit(top_k: int, options: RetrievalOptions) -> int:
+    if not _use_mmr(options):
+        return top_k
+    return max(top_k, options.mmr_pool_size or settings.mmr_pool_size)
+
+
+def _chunk_fields(options: RetrievalOptions) -> tuple:
+    return (*_CHUNK_FIELDS, Chunk.embedding) if _use_mmr(options) else _CHUNK_FIELDS
+
+
+def _diversify(rows, query_embedding, top_k: int, options: RetrievalOptions, scores=None):
+    if not _use_mmr(options):
+        return rows
+    mmr_lambda = settings.mmr_lambda if options.mmr_lambda is None else options.mmr_lambda
+    with timed("mmr"):
+        selected = mmr_select(
+            query_embedding, [row.embedding for row in rows], top_k, mmr_lambda, scores
+        )
+    return [rows[index] for index in selected]
+
+
+def _fused_scores(rows, hybrid) -> list[float] | None:
+    return [row.score for row in rows] if hybrid else None
+
+
+def _hybrid_weights(options: RetrievalOptions) -> tuple[float, float]:
+    vector_weight = options.vector_weight
+    text_weight = options.text_weight
+    return (
+        settings.hybrid_vector_weight if vector_weight is None else vector_weight,
+        settings.hybrid_text_weight if text_weight is None else text_weight,
+    )
+
+
+def _repo_clause(repo_id, column=Chunk.repo_id):
+    if isinstance(repo_id, (list, tuple)):
+        return column.in_(repo_id)
+    return column == repo_id
+
+
+def _binary_quantize(value):
+    return cast(func.binary_quantize(value), BIT(settings.embedding_dim))
+
+
+def _vector_ranked(repo_id, query_embedding, limit: int, outer=None):
+    distance = Chunk.embedding.l2_distance(query_embedding)
+    if settings.vector_index_quantization != "binary":
+        stmt = (
+            select(
+                Chunk.id, Chunk.repo_id, func.row_number().over(order_by=distance).label("rank")
+            )
+            .where(_repo_clause(repo_id))
+            .order_by(distance)
+            .limit(limit)
+        )
+        return stmt if outer is None else stmt.correlate(outer)
+
+    if outer is None:
+        query = cast(literal(query_embedding, Chunk.embedding.type), Chunk.embedding.type)
+    else:
+        query = query_embedding
+    hamming = _binary_quantize(Chunk.embedding).op("<~>")(_binary_quantize(query))
+    shortlist = (
+        select(Chunk.id, Chunk.repo_id, distance.label("distance"))
+        .where(_repo_clause(repo_id))
+        .order_by(hamming)
+        .limit(limit * settings.binary_rerank_factor)
+    )
+    if outer is None:
+        shortlist = shortlist.subquery("shortlist")
+    else:
+        shortlist = shortlist.correlate(outer).lateral("shortlist")
+    return (
+        select(
+            shortlist.c.id,
+            shortlist.c.repo_id,
+            func.row_number().over(order_by=shortlist.c.distance).label("rank"),
+        )
+        .order_by(shortlist.c.distance)
+        .limit(limit)
+    )
+
+
+def _search_limit(limit: int) -> int:
+    if settings.vector_index_quantization == "binary":
+        return limit * settings.binary_rerank_factor
+    return limit
+
+
+def _text_ranked(repo_id, question, limit: int, outer=None):
+    terms = func.replace(cast(func.plainto_tsquery("english", question), Text), "&", "|")
+    query = cast(terms, TSQUERY)
+    text_rank = func.ts_rank_cd(Chunk.content_tsv, query)
+    order = (text_rank.desc(), Chunk.id)
     stmt = (
-        select(Chunk)
+        select(Chunk.id, Chunk.repo_id, func.row_number().over(order_by=order).label("rank"))
+        .where(_repo_clause(repo_id), Chunk.content_tsv.op("@@")(query))
+        .order_by(*order)
+        .limit(limit)
+    )
+    return stmt if outer is None else stmt.correlate(outer)
+
+
+def _fused_ranked(
+    repo_id,
+    query_embedding,
+    question: str,
+    candidates: int,
+    vector_weight: float,
+    text_weight: float,
+):
+    rrf_k = settings.hybrid_rrf_k
+    vector_ranked = _vector_ranked(repo_id, query_embedding, candidates).cte("vector_ranked")
+
+    text_ranked = _text_ranked(repo_id, question, candidates).cte("text_ranked")
+
+    score = func.coalesce(vector_weight / (rrf_k + vector_ranked.c.rank), 0.0) + func.coalesce(
+        text_weight / (rrf_k + text_ranked.c.rank), 0.0
+    )
+    return (
+        select(
+            func.coalesce(vector_ranked.c.id, text_ranked.c.id).label("id"),
+            func.coalesce(vector_ranked.c.repo_id, text_ranked.c.repo_id).label("repo_id"),
+            score.label("score"),
+        )
+        .select_from(
+            vector_ranked.join(text_ranked, vector_ranked.c.id == text_ranked.c.id, full=True)
+        )
+        .cte("fused")
+        .prefix_with("MATERIALIZED")
+    )
+
+
+def _hybrid_statement(
+    repo_id,
+    query_embedding,
+    question: str,
+    top_k: int,
+    vector_weight: float,
+    text_weight: float,
+    fields: tuple = _CHUNK_FIELDS,
+):
+    candidates = max(top_k, settings.hybrid_candidates)
+    fused = _fused_ranked(
+        repo_id, query_embedding, question, candidates, vector_weight, text_weight
+    )
+    return (
+        select(*fields, fused.c.score)
+        .join(fused, Chunk.id == fused.c.id)
         .where(Chunk.repo_id == repo_id)
-        .order_by(Chunk.embedding.l2_distance(query_embedding))
+        .order_by(fused.c.score.desc(), fused.c.id)
         .limit(top_k)
     )
-    return session.execute(stmt).scalars().all()
+
+
+async def retrieve_chunks(
+    session: AsyncSession,
+    repo_id,
+    query_embedding,
+    top_k: int = 10,
+    question: str | None = None,
+    options: RetrievalOptions | None = None,
+):
+    options = options or RetrievalOptions()
+    mode = options.mode or settings.retrieval_mode
+    limit = _fetch_limit(top_k, options)
+    fields = _chunk_fields(options)
+    hybrid = mode == "hybrid" and question
+    if hybrid:
+        stmt = _hybrid_statement(
+            repo_id, query_embedding, question, limit, *_hybrid_weights(options), fields
+        )
+        candidates = max(limit, settings.hybrid_candidates)
+        await session.run_sync(set_search_params, _search_limit(candidates))
+    elif settings.vector_index_quantization == "binary":
+        ranked = _vector_ranked(repo_id, query_embedding, limit).cte("vector_ranked")
+        stmt = (
+            select(*fields)
+            .join(ranked, Chunk.id == ranked.c.id)
+            .where(Chunk.repo_id == repo_id)
+            .order_by(ranked.c.rank)
+        )
+        await session.run_sync(set_search_params, _search_limit(limit))
+    else:
+        stmt = (
+            select(*fields)
+            .where(Chunk.repo_id == repo_id)
+            .order_by(Chunk.embedding.l2_distance(query_embedding))
+            .limit(limit)
+        )
+        await session.run_sync(set_search_params, limit)
+    rows = (await session.execute(stmt)).all()
+    return _diversify(rows, query_embedding, top_k, options, _fused_scores(rows, hybrid))
+
+
+async def retrieve_chunks_multi(
+    session: AsyncSession,
+    repo_ids: list,
+    query_embedding,
+    top_k: int = 10,
+    question: str | None = None,
+    options: RetrievalOptions | None = None,
+    per_repo_limit: int | None = None,
+):
+    options = options or RetrievalOptions()
+    mode = options.mode or settings.retrieval_mode
+    hybrid = mode == "hybrid" and question
+    limit = _fetch_limit(top_k, options)
+    candidates = max(limit, settings.hybrid_candidates) if hybrid else limit
+    if per_repo_limit:
+        # Quotas drop candidates from over-represented repos, so widen the merged pool.
+        candidates = max(candidates, limit * len(repo_ids))
+    if hybrid:
+        ranked = _fused_ranked(
+            repo_ids, query_embedding, question, candidates, *_hybrid_weights(options)
+        )
+        order = (ranked.c.score.desc(), ranked.c.id)
+        score = ranked.c.score
+    else:
+        ranked = _vector_ranked(repo_ids, query_embedding, candidates).cte("vector_ranked")
+        order = (ranked.c.rank,)
+        score = literal(None)
+    await session.run_sync(set_search_params, _search_limit(candidates))
+
+    pool = select(
+        ranked.c.id,
+        ranked.c.repo_id,
+        score.label("score"),
+        func.row_number().over(order_by=order).label("position"),
+        func.row_number().over(partition_by=ranked.c.repo_id, order_by=order).label("repo_rank"),
+    ).subquery("pool")
+    stmt = (
+        select(
+            *_chunk_fields(options),
+            Chunk.repo_id,
+            _REPO_LABEL,
+            pool.c.score,
+        )
+        .join(pool, and_(Chunk.id == pool.c.id, Chunk.repo_id == pool.c.repo_id))
+        .join(Repo, Repo.id == Chunk.repo_id)
+        .where(Chunk.repo_id.in_(repo_ids))
+        .order_by(pool.c.position)
+        .limit(limit)
+    )
+    if per_repo_limit:
+        stmt = stmt.where(pool.c.repo_rank <= per_repo_limit)
+    rows = (await session.execute(stmt)).all()
+    return _diversify(rows, query_embedding, top_k, options, _fused_scores(rows, hybrid))
+
+
+def _is_identifier(token: str) -> bool:
+    return not (_ABBREVIATION.fullmatch(token) or _FILE_SUFFIX.search(token))
+
+
+def question_identifiers(question: str) -> list[str]:
+    identifiers = [
+        match.group()
+        for quoted in _QUOTED.findall(question)
+        for match in _IDENTIFIER.finditer(quoted)
+    ]
+    unquoted = _QUOTED.sub(" ", question)
+    for match in _IDENTIFIER.finditer(unquoted):
+        token = match.group()
+        is_call = unquoted[match.end() : match.end() + 1] == "("
+        if is_call or _CODE_LIKE.search(token) or _DOTTED_PATH.fullmatch(token):
+            identifiers.append(token)
+    identifiers = [token for token in identifiers if _is_identifier(token)]
+    return list(dict.fromkeys(identifiers))[:MAX_QUESTION_IDENTIFIERS]
+
+
+def _symbol_targets(ident: str) -> tuple[str, str]:
+    name = _SYMBOL_SEPARATOR.split(ident)[-1].lower()
+    if _SYMBOL_SEPARATOR.search(ident):
+        return name, _SYMBOL_SEPARATOR.sub(".", ident).lower()
+    return name, ""
+
+
+def _like_pattern(name: str) -> str:
+    escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+async def _symbol_hits(session: AsyncSession, repo_id, targets: list, limit: int, exact: bool):
+    ords, names, qualified = zip(*targets)
+    wanted = (
+        func.unnest(
+            cast(list(ords), ARRAY(Integer)),
+            cast(list(names), ARRAY(Text)),
+            cast(list(qualified), ARRAY(Text)),
+        )
+        .table_valued("ord", "name", "qualified")
+        .render_derived("wanted")
+    )
+    symbol_name = func.lower(ChunkSymbol.name)
+    qualified_name = func.lower(ChunkSymbol.qualified_name)
+    if exact:
+        suffix = func.right(qualified_name, func.length(wanted.c.qualified) + 1)
+        match = and_(
+            symbol_name == wanted.c.name,
+            or_(
+                wanted.c.qualified == "",
+                qualified_name == wanted.c.qualified,
+                suffix == literal(".") + wanted.c.qualified,
+            ),
+        )
+    else:
+        match = symbol_name.like(wanted.c.name, escape="\\")
+
+    matched = (
+        select(
+            wanted.c.ord,
+            ChunkSymbol.repo_id,
+            ChunkSymbol.chunk_id,
+            func.min(func.length(ChunkSymbol.name)).label("rank"),
+        )
+        .select_from(wanted)
+        .join(ChunkSymbol, match)
+        .where(_repo_clause(repo_id, ChunkSymbol.repo_id))
+        .group_by(wanted.c.ord, ChunkSymbol.repo_id, ChunkSymbol.chunk_id)
+        .subquery()
+    )
+    ranked = (
+        select(
+            matched.c.ord,
+            matched.c.repo_id,
+            matched.c.chunk_id,
+            func.row_number()
+            .over(
+                partition_by=matched.c.ord,
+                order_by=(matched.c.rank, Chunk.path, Chunk.start_line, Chunk.id),
+            )
+            .label("position"),
+        )
+        .join(Chunk, and_(Chunk.repo_id == matched.c.repo_id, Chunk.id == matched.c.chunk_id))
+        .subquery()
+    )
+    stmt = (
+        select(ranked.c.ord, *_CHUNK_FIELDS)
+        .join(ranked, and_(Chunk.repo_id == ranked.c.repo_id, Chunk.id == ranked.c.chunk_id))
+        .where(ranked.c.position <= limit)
+        .order_by(ranked.c.ord, ranked.c.position)
+    )
+    if isinstance(repo_id, (list, tuple)):
+        stmt = stmt.add_columns(Chunk.repo_id, _REPO_LABEL).join(Repo, Repo.id == Chunk.repo_id)
+    hits: dict[int, list] = {}
+    for row in await session.execute(stmt):
+        hits.setdefault(row.ord, []).append(row)
+    return hits
+
+
+async def lookup_symbols_batch(
+    session: AsyncSession, repo_id, questions: list[str], limit: int
+) -> list[list]:
+    identifiers = [question_identifiers(question) for question in questions]
+    targets = [
+        (index, *_symbol_targets(ident))
+        for index, idents in enumerate(identifiers)
+        for ident in idents
+    ]
+    if not targets or limit <= 0:
+        return [[] for _ in questions]
+
+    # Exact names use the B-tree index; substring matches fall back to the trigram index.
+    hits = await _symbol_hits(session, repo_id, targets, limit, exact=True)
+    partial = list(
+        dict.fromkeys(
+            (index, _like_pattern(name), "")
+            for index, name, _ in targets
+            if index not in hits and len(name) >= 4
+        )
+    )
+    if partial:
+        hits.update(await _symbol_hits(session, repo_id, partial, limit, exact=False))
+    return [hits.get(index, []) for index in range(len(questions))]
+
+
+async def lookup_symbols(session: AsyncSession, repo_id, question: str, limit: int):
+    return (await lookup_symbols_batch(session, repo_id, [question], limit))[0]
+
+
+def _merge_symbol_hits(hits, chunks, top_k: int):
+    if not hits:
+        return chunks
+    seen = {row.id for row in hits}
+    return [*hits, *(chunk for chunk in chunks if chunk.id not in seen)][:top_k]
+
+
+def _question_table(questions: list[str], query_embeddings: list[list[float]]):
+    rows = func.unnest(
+        cast(questions, ARRAY(Text)),
+        cast([to_db(embedding) for embedding in query_embeddings], ARRAY(Text)),
+    ).table_valued("question", "embedding", with_ordinality="ord").render_derived("question_rows")
+    return (
+        select(
+            rows.c.ord,
+            rows.c.question,
+            cast(rows.c.embedding, Chunk.embedding.type).label("embedding"),
+        )
+        .cte("questions")
+        .prefix_with("MATERIALIZED")
+    )
+
+
+async def retrieve_chunks_batch(
+    session: AsyncSession,
+    repo_id,
+    query_embeddings: list[list[float]],
+    questions: list[str],
+    top_k: int = 10,
+    options: RetrievalOptions | None = None,
+):
+    options = options or RetrievalOptions()
+    mode = options.mode or settings.retrieval_mode
+    limit = _fetch_limit(top_k, options)
+    questions_table = _question_table(questions, query_embeddings)
+    if mode == "hybrid":
+        candidates = max(limit, settings.hybrid_candidates)
+        vector_weight, text_weight = _hybrid_weights(options)
+        rrf_k = settings.hybrid_rrf_k
+        vector_ranked = _vector_ranked(
+            repo_id, questions_table.c.embedding, candidates, questions_table
+        ).lateral("vector_ranked")
+        text_ranked = _text_ranked(
+            repo_id, questions_table.c.question, candidates, questions_table
+        ).lateral("text_ranked")
+        scores = union_all(
+            select(
+                vector_ranked.c.id,
+                (vector_weight / (rrf_k + vector_ranked.c.rank)).label("score"),
+            ),
+            select(text_ranked.c.id, (text_weight / (rrf_k + text_ranked.c.rank)).label("score")),
+        ).subquery("scores")
+        score = func.sum(scores.c.score)
+        ranked = (
+            select(scores.c.id, score.label("score"))
+            .group_by(scores.c.id)
+            .order_by(score.desc(), scores.c.id)
+            .limit(limit)
+            .lateral("ranked")
+        )
+        order = (ranked.c.score.desc(), ranked.c.id)
+        fields = (*_chunk_fields(options), ranked.c.score)
+        await session.run_sync(set_search_params, _search_limit(candidates))
+    else:
+        ranked = _vector_ranked(
+            repo_id, questions_table.c.embedding, limit, questions_table
+        ).lateral("ranked")
+        order = (ranked.c.rank,)
+        fields = _chunk_fields(options)
+        await session.run_sync(set_search_params, _search_limit(limit))
+
+    stmt = (
+        select(questions_table.c.ord, *fields)
+        .select_from(questions_table)
+        .join(ranked, true())
+        .join(Chunk, Chunk.id == ranked.c.id)
+        .where(Chunk.repo_id == repo_id)
+        .order_by(questions_table.c.ord, *order)
+    )
+    results: list[list] = [[] for _ in questions]
+    for row in await session.execute(stmt):
+        results[row.ord - 1].append(row)
+    return [
+        _diversify(rows, query_embedding, top_k, options, _fused_scores(rows, mode == "hybrid"))
+        for rows, query_embedding in zip(results, query_embeddings)
+    ]
+
+
+async def _retrieve_resident(
+    session: AsyncSession,
+    vectors: RepoVectors,
+    repo_id,
+    query_embedding,
+    top_k: int,
+    question: str | None,
+    options: RetrievalOptions,
+):
+    mode = options.mode or settings.retrieval_mode
+    limit = _fetch_limit(top_k, options)
+    if mode == "hybrid" and question:
+        candidates = max(limit, settings.hybrid_candidates)
+        vector_weight, text_weight = _hybrid_weights(options)
+        text_ranked = await session.execute(_text_ranked(repo_id, question, candidates))
+        ranked = [
+            (vector_weight, vectors.search(query_embedding, candidates)),
+            (text_weight, text_ranked.scalars().all()),
+        ]
+        rrf_k = settings.hybrid_rrf_k
+        scores: dict = {}
+        for weight, ids in ranked:
+            for rank, chunk_id in enumerate(ids, start=1):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (rrf_k + rank)
+        chunk_ids = sorted(scores, key=scores.get, reverse=True)[:limit]
+    else:
+        chunk_ids = vectors.search(query_embedding, limit)
+
+    rows = await session.execute(
+        select(*_chunk_fields(options)).where(Chunk.repo_id == repo_id, Chunk.id.in_(chunk_ids))
+    )
+    by_id = {row.id: row for row in rows}
+    ordered = [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+    fused = [scores[row.id] for row in ordered] if mode == "hybrid" and question else None
+    return _diversify(ordered, query_embedding, top_k, options, fused)
+
+
+async def search_chunks(
+    session: AsyncSession,
+    repo: Repo,
+    query_embedding,
+    top_k: int = 10,
+    question: str | None = None,
+    options: RetrievalOptions | None = None,
+):
+    options = options or RetrievalOptions()
+    if settings.vector_engine == "numpy" and repo.status == "done":
+        vectors = vector_store.get(repo.id, repo.index_version)
+        if vectors is not None:
+            return await _retrieve_resident(
+                session, vectors, repo.id, query_embedding, top_k, question, options
+            )
+        vector_store.schedule_load(repo.id, repo.index_version)
+    return await retrieve_chunks(session, repo.id, query_embedding, top_k, question, options)
+
+
+async def search_chunks_batch(
+    session: AsyncSession,
+    repo: Repo,
+    query_embeddings: list[list[float]],
+    questions: list[str],
+    top_k: int = 10,
+    options: RetrievalOptions | None = None,
+):
+    options = options or RetrievalOptions()
+    if settings.vector_engine == "numpy" and repo.status == "done":
+        vectors = vector_store.get(repo.id, repo.index_version)
+        if vectors is not None:
+            return [
+                await _retrieve_resident(
+                    session, vectors, repo.id, query_embedding, top_k, question, options
+                )
+                for query_embedding, question in zip(query_embeddings, questions)
+            ]
+        vector_store.schedule_load(repo.id, repo.index_version)
+    return await retrieve_chunks_batch(
+        session, repo.id, query_embeddings, questions, top_k, options
+    )
 
 
 def _parse_answer_payload(raw_answer: str) -> dict | None:
@@ -107,7 +707,10 @@ def _extract_answer_and_sources(
 
 
 def _format_sources(sources: list[dict[str, int | str]]) -> list[str]:
-    return [f"{s['path']}:{s['start_line']}-{s['end_line']}" for s in sources]
+    return [
+        f"{s['repo'] + '/' if 'repo' in s else ''}{s['path']}:{s['start_line']}-{s['end_line']}"
+        for s in sources
+    ]
 
 
 def _is_prompt_injection(text: str) -> bool:
@@ -139,58 +742,168 @@ def _log_prompt_injection(repo_id: str):
         )
 
 
-def answer_question(session: Session, repo: Repo, question: str):
+@dataclass
+class PreparedAnswer:
+    repo_id: str
+    sources: list[dict[str, int | str]]
+    messages: list[dict[str, str]]
+    refusal: str | None = None
+    rag_trace_id: str | None = None
+    provided_sources: list[str] | None = None
+
+
+async def prepare_answer(
+    session: AsyncSession,
+    repo: Repo,
+    question: str,
+    options: RetrievalOptions | None = None,
+) -> PreparedAnswer:
+    if not settings.openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY is required")
+
+    with timed("symbol_lookup"):
+        hits = await lookup_symbols(session, repo.id, question, settings.symbol_lookup_limit)
+    client = get_async_openai_client()
+    query_embedding = await cached_query_embedding(
+        session, question, lambda texts: _embed_queries(client, texts)
+    )
+    with timed("retrieval"):
+        chunks = await search_chunks(
+            session,
+            repo,
+            query_embedding,
+            top_k=settings.retrieval_top_k,
+            question=question,
+            options=options,
+        )
+    chunks = _merge_symbol_hits(hits, chunks, settings.retrieval_top_k)
+    return _prepare_from_chunks(str(repo.id), question, chunks)
+
+
+async def prepare_answers(
+    session: AsyncSession,
+    repo: Repo,
+    questions: list[str],
+    options: RetrievalOptions | None = None,
+) -> list[PreparedAnswer]:
     if not settings.openai_api_key:
         raise RuntimeError("OPENAI_API_KEY is required")
 
-    client = OpenAI(api_key=settings.openai_api_key)
-    query_embedding = _embed_query(client, question)
-    chunks = retrieve_chunks(session, repo.id, query_embedding, top_k=10)
+    with timed("symbol_lookup"):
+        hits = await lookup_symbols_batch(
+            session, repo.id, questions, settings.symbol_lookup_limit
+        )
+    client = get_async_openai_client()
+    query_embeddings = await cached_query_embeddings(
+        session, questions, lambda texts: _embed_queries(client, texts)
+    )
+    with timed("batch_retrieval"):
+        results = await search_chunks_batch(
+            session,
+            repo,
+            query_embeddings,
+            questions,
+            top_k=settings.retrieval_top_k,
+            options=options,
+        )
+    return [
+        _prepare_from_chunks(
+            str(repo.id),
+            question,
+            _merge_symbol_hits(question_hits, chunks, settings.retrieval_top_k),
+        )
+        for question, question_hits, chunks in zip(questions, hits, results)
+    ]
+
+
+async def search_repos(
+    session: AsyncSession,
+    repo_ids: list,
+    question: str,
+    top_k: int,
+    options: RetrievalOptions | None = None,
+    per_repo_limit: int | None = None,
+):
+    if not settings.openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY is required")
 
-    context_lines = []
-    sources = []
-    for i, chunk in enumerate(chunks, start=1):
-        label = f"[{i}] {chunk.path}:{chunk.start_line}-{chunk.end_line}"
-        context_lines.append(f"{label}\n{chunk.content}")
-        sources.append(
-            {"path": chunk.path, "start_line": chunk.start_line, "end_line": chunk.end_line}
+    with timed("symbol_lookup"):
+        hits = await lookup_symbols(
+            session, repo_ids, question, min(top_k, settings.symbol_lookup_limit)
+        )
+    client = get_async_openai_client()
+    query_embedding = await cached_query_embedding(
+        session, question, lambda texts: _embed_queries(client, texts)
+    )
+    with timed("retrieval"):
+        chunks = await retrieve_chunks_multi(
+            session, repo_ids, query_embedding, top_k, question, options, per_repo_limit
         )
+    return _merge_symbol_hits(hits, chunks, top_k)
+
+
+async def prepare_multi_answer(
+    session: AsyncSession,
+    repo_ids: list,
+    question: str,
+    options: RetrievalOptions | None = None,
+    per_repo_limit: int | None = None,
+) -> PreparedAnswer:
+    chunks = await search_repos(
+        session, repo_ids, question, settings.retrieval_top_k, options, per_repo_limit
+    )
+    return _prepare_from_chunks(",".join(str(repo_id) for repo_id in repo_ids), question, chunks)
+
 
-    context = "\n\n".join(context_lines)
+def _prepare_from_chunks(repo_id: str, question: str, chunks) -> PreparedAnswer:
+    with timed("context_build"):
+        assembled = build_context(chunks, settings.context_token_budget)
+    context = assembled.text
+    sources = assembled.sources
     prompt = user_prompt(context=context, question=question)
+    prepared = PreparedAnswer(
+        repo_id=repo_id,
+        sources=sources,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+    )
 
     if _is_prompt_injection(context) or _is_prompt_injection(question):
-        _log_prompt_injection(str(repo.id))
-        safe_answer = (
+        _log_prompt_injection(repo_id)
+        prepared.refusal = (
             "I can't help with that. Please ask a question about the repository's code or "
             "documentation."
         )
-        return safe_answer, []
+        return prepared
 
-    rag_trace_id = None
-    provided_sources = None
     if settings.rag_debug:
-        rag_trace_id = uuid.uuid4().hex
-        provided_sources = _format_sources(sources)
+        prepared.rag_trace_id = current_trace_id() or uuid.uuid4().hex
+        prepared.provided_sources = _format_sources(sources)
         logger.info(
             json.dumps(
                 {
                     "event": "rag_sources_provided",
-                    "rag_trace_id": rag_trace_id,
-                    "repo_id": str(repo.id),
-                    "count": len(provided_sources),
-                    "sources": provided_sources,
+                    "rag_trace_id": prepared.rag_trace_id,
+                    "repo_id": prepared.repo_id,
+                    "count": len(prepared.provided_sources),
+                    "chunks_retrieved": len(chunks),
+                    "context_tokens": assembled.tokens,
+                    "sources": prepared.provided_sources,
                 }
             )
         )
 
-    response = client.chat.completions.create(
+    return prepared
+
+
+async def _create_completion(prepared: PreparedAnswer, stream: bool = False):
+    return await get_async_openai_client().chat.completions.create(
         model=settings.chat_model,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt},
-        ],
+        messages=prepared.messages,
         temperature=settings.chat_temperature,
+        stream=stream,
         response_format={
             "type": "json_schema",
             "json_schema": {
@@ -212,13 +925,122 @@ def answer_question(session: Session, repo: Repo, question: str):
         },
     )
 
-    raw_answer = response.choices[0].message.content.strip()
 
+def _finish_answer(prepared: PreparedAnswer, raw_answer: str):
     return _extract_answer_and_sources(
         raw_answer,
-        sources,
+        prepared.sources,
         rag_debug=settings.rag_debug,
-        rag_trace_id=rag_trace_id,
-        repo_id=str(repo.id),
-        provided_sources=provided_sources,
+        rag_trace_id=prepared.rag_trace_id,
+        repo_id=prepared.repo_id,
+        provided_sources=prepared.provided_sources,
     )
+
+
+async def answer_question(
+    session: AsyncSession,
+    repo: Repo,
+    question: str,
+    options: RetrievalOptions | None = None,
+):
+    return await generate_answer(await prepare_answer(session, repo, question, options))
+
+
+async def generate_answer(prepared: PreparedAnswer):
+    if prepared.refusal:
+        return prepared.refusal, []
+
+    with timed("llm"):
+        response = await _create_completion(prepared)
+    record_llm_usage(response)
+    raw_answer = response.choices[0].message.content.strip()
+    return _finish_answer(prepared, raw_answer)
+
+
+async def generate_answers(prepared: list[PreparedAnswer]) -> list:
+    semaphore = asyncio.Semaphore(settings.chat_batch_concurrency)
+
+    async def generate(item: PreparedAnswer):
+        async with semaphore:
+            return await generate_answer(item)
+
+    return await asyncio.gather(*(generate(item) for item in prepared), return_exceptions=True)
+
+
+class AnswerStreamParser:
+    def __init__(self) -> None:
+        self.raw = ""
+        self.found = False
+        self.done = False
+        self._pos = 0
+
+    def feed(self, delta: str) -> str:
+        self.raw += delta
+        if not self.found:
+            match = _ANSWER_KEY.search(self.raw)
+            if not match:
+                return ""
+            self.found = True
+            self._pos = match.end()
+        if self.done:
+            return ""
+
+        raw = self.raw
+        end = self._pos
+        while end < len(raw):
+            char = raw[end]
+            if char == '"':
+                self.done = True
+                break
+            if char != "\\":
+                end += 1
+                continue
+            if end + 1 >= len(raw):
+                break
+            if raw[end + 1] != "u":
+                end += 2
+                continue
+            escape_end = end + 6
+            if _HIGH_SURROGATE.match(raw, end):
+                escape_end += 6
+            if escape_end > len(raw):
+                break
+            end = escape_end
+
+        segment = raw[self._pos : end]
+        self._pos = end
+        try:
+            return json.loads(f'"{segment}"')
+        except json.JSONDecodeError:
+            return segment
+
+
+async def stream_answer(prepared: PreparedAnswer) -> AsyncIterator[tuple[str, dict]]:
+    yield "sources", {"sources": prepared.sources}
+    if prepared.refusal:
+        yield "token", {"text": prepared.refusal}
+        yield "done", {"answer": prepared.refusal, "sources": []}
+        return
+
+    parser = AnswerStreamParser()
+    start = time.perf_counter()
+    first_token = True
+    stream = await _create_completion(prepared, stream=True)
+    try:
+        async for chunk in stream:
+            if first_token:
+                observe("llm_first_token", time.perf_counter() - start)
+                first_token = False
+            if not chunk.choices:
+                continue
+            text = parser.feed(chunk.choices[0].delta.content or "")
+            if text:
+                yield "token", {"text": text}
+    finally:
+        await stream.close()
+        observe("llm", time.perf_counter() - start)
+
+    answer, cited_sources = _finish_answer(prepared, parser.raw.strip())
+    if not parser.found:
+        yield "token", {"text": answer}
+    yield "done", {"answer": answer, "sources": cited_sources}
@@ -0,0 +1,162 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Mapping
+
+from app.config import settings
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+# Stop growing concurrency once the provider reports less than this share of its budget left.
+HEADROOM_FRACTION = 0.1
+
+
+def parse_duration(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> int | None:
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int, share: int = 1) -> None:
+        self.share = max(1, share)
+        self.capacity = self._scaled(per_minute)
+        self.configured = per_minute > 0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _scaled(self, per_minute: int) -> int:
+        return max(1, per_minute // self.share) if per_minute > 0 else 0
+
+    def _refill(self, now: float) -> None:
+        if self.capacity:
+            elapsed = now - self.updated
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / 60)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens * 60 / self.capacity)
+
+    def observe(self, limit: int | None, remaining: int | None, now: float) -> bool:
+        if limit and not self.configured and self._scaled(limit) != self.capacity:
+            self.capacity = self._scaled(limit)
+            self.tokens = float(self.capacity if remaining is None else remaining / self.share)
+        self._refill(now)
+        if remaining is None:
+            return True
+        self.tokens = min(self.tokens, remaining / self.share)
+        return not limit or remaining >= limit * HEADROOM_FRACTION
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self, rpm: int, tpm: int, initial_concurrency: int, max_concurrency: int
+    ) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = initial_concurrency
+        self.max_limit = max_concurrency
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.completed = 0
+        self._successes = 0
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self, tokens: int):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+            now = time.monotonic()
+            wait = max(
+                self._blocked_until - now,
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+            )
+        try:
+            if wait > 0:
+                time.sleep(wait)
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify()
+
+    def record_success(self, headers: Mapping[str, str]) -> None:
+        with self._condition:
+            now = time.monotonic()
+            requests_ok = self.requests.observe(
+                _int_header(headers, "x-ratelimit-limit-requests"),
+                _int_header(headers, "x-ratelimit-remaining-requests"),
+                now,
+            )
+            tokens_ok = self.tokens.observe(
+                _int_header(headers, "x-ratelimit-limit-tokens"),
+                _int_header(headers, "x-ratelimit-remaining-tokens"),
+                now,
+            )
+            self.completed += 1
+            if not (requests_ok and tokens_ok):
+                self._successes = 0
+                return
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify()
+
+    def record_rate_limit(self, retry_after: float) -> None:
+        with self._condition:
+            self.rate_limited += 1
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    def share_between(self, processes: int) -> None:
+        # Limits are account-wide, so each of several processes gets an equal slice.
+        with self._condition:
+            self.requests = TokenBucket(self.rpm, processes)
+            self.tokens = TokenBucket(self.tpm, processes)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "concurrency_limit": self.limit,
+                "max_concurrency": self.max_limit,
+                "in_flight": self.in_flight,
+                "rpm_limit": self.requests.capacity,
+                "tpm_limit": self.tokens.capacity,
+                "completed": self.completed,
+                "rate_limited": self.rate_limited,
+            }
+
+
+embedding_rate_limiter = AdaptiveRateLimiter(
+    settings.embedding_rpm_limit,
+    settings.embedding_tpm_limit,
+    settings.embedding_concurrency,
+    settings.embedding_max_concurrency,
+)
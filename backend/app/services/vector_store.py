@@ -0,0 +1,205 @@
+import asyncio
+import glob
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Chunk, Repo
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BLOCK_ROWS = 65536
+LOAD_BATCH_ROWS = 1000
+
+
+def _float_blocks(matrix: np.ndarray):
+    for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+        yield start, matrix[start : start + SEARCH_BLOCK_ROWS].astype(np.float32, copy=False)
+
+
+@dataclass
+class RepoVectors:
+    version: int
+    ids: np.ndarray
+    matrix: np.ndarray
+    sq_norms: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.matrix.nbytes + self.sq_norms.nbytes
+
+    def search(self, query_embedding, top_k: int) -> list[uuid.UUID]:
+        count = len(self.matrix)
+        if count == 0 or top_k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = np.empty(count, dtype=np.float32)
+        for start, block in _float_blocks(self.matrix):
+            np.matmul(block, query, out=distances[start : start + len(block)])
+        distances *= -2
+        distances += self.sq_norms
+        k = min(top_k, count)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [uuid.UUID(bytes=self.ids[i].tobytes()) for i in top]
+
+
+def _cache_paths(repo_id: uuid.UUID, version: int) -> tuple[str, str]:
+    prefix = os.path.join(
+        settings.vector_cache_dir, f"{repo_id}-v{version}-{settings.vector_cache_dtype}"
+    )
+    return f"{prefix}.vectors.npy", f"{prefix}.ids.npy"
+
+
+def _current_version(session: Session, repo_id: uuid.UUID) -> int | None:
+    return session.scalar(select(Repo.index_version).where(Repo.id == repo_id))
+
+
+def _write_cache_files(session: Session, repo_id: uuid.UUID, version: int) -> bool:
+    vectors_path, ids_path = _cache_paths(repo_id, version)
+    count = session.scalar(select(func.count()).select_from(Chunk).where(Chunk.repo_id == repo_id))
+    os.makedirs(settings.vector_cache_dir, exist_ok=True)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    matrix = np.lib.format.open_memmap(
+        vectors_path + suffix,
+        mode="w+",
+        dtype=settings.vector_cache_dtype,
+        shape=(count, settings.embedding_dim),
+    )
+    ids = np.zeros((count, 16), dtype=np.uint8)
+    written = 0
+    rows = session.execute(
+        select(Chunk.id, Chunk.embedding)
+        .where(Chunk.repo_id == repo_id)
+        .execution_options(yield_per=LOAD_BATCH_ROWS)
+    )
+    for row in rows:
+        if written < count:
+            matrix[written] = row.embedding
+            ids[written] = np.frombuffer(row.id.bytes, dtype=np.uint8)
+        written += 1
+    matrix.flush()
+    del matrix
+
+    if written != count or _current_version(session, repo_id) != version:
+        os.remove(vectors_path + suffix)
+        return False
+    with open(ids_path + suffix, "wb") as f:
+        np.save(f, ids)
+    os.replace(ids_path + suffix, ids_path)
+    os.replace(vectors_path + suffix, vectors_path)
+    return True
+
+
+def _remove_stale_files(repo_id: uuid.UUID, version: int) -> None:
+    current = set(_cache_paths(repo_id, version))
+    for path in glob.glob(os.path.join(settings.vector_cache_dir, f"{repo_id}-v*.npy")):
+        if path not in current:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def load_repo_vectors(session: Session, repo_id: uuid.UUID, version: int) -> RepoVectors | None:
+    if _current_version(session, repo_id) != version:
+        return None
+    vectors_path, ids_path = _cache_paths(repo_id, version)
+    if not (os.path.exists(vectors_path) and os.path.exists(ids_path)):
+        if not _write_cache_files(session, repo_id, version):
+            return None
+        _remove_stale_files(repo_id, version)
+
+    matrix = np.load(vectors_path, mmap_mode="r")
+    sq_norms = np.empty(len(matrix), dtype=np.float32)
+    for start, block in _float_blocks(matrix):
+        np.einsum("ij,ij->i", block, block, out=sq_norms[start : start + len(block)])
+    return RepoVectors(version, np.load(ids_path), matrix, sq_norms)
+
+
+class VectorStore:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self._repos: OrderedDict[uuid.UUID, RepoVectors] = OrderedDict()
+        self._loading: set[uuid.UUID] = set()
+        self._oversized: dict[uuid.UUID, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, repo_id: uuid.UUID, version: int) -> RepoVectors | None:
+        with self._lock:
+            vectors = self._repos.get(repo_id)
+            if vectors is not None and vectors.version != version:
+                del self._repos[repo_id]
+                vectors = None
+            if vectors is None:
+                self.misses += 1
+                return None
+            self._repos.move_to_end(repo_id)
+            self.hits += 1
+            return vectors
+
+    def schedule_load(self, repo_id: uuid.UUID, version: int) -> None:
+        with self._lock:
+            if repo_id in self._loading or self._oversized.get(repo_id) == version:
+                return
+            self._loading.add(repo_id)
+        asyncio.get_running_loop().run_in_executor(None, self._load, repo_id, version)
+
+    def _load(self, repo_id: uuid.UUID, version: int) -> None:
+        try:
+            with SessionLocal() as session:
+                vectors = load_repo_vectors(session, repo_id, version)
+            if vectors is not None:
+                self._insert(repo_id, vectors)
+        except Exception:
+            logger.exception("Failed to load vectors for repo %s", repo_id)
+        finally:
+            with self._lock:
+                self._loading.discard(repo_id)
+
+    def _insert(self, repo_id: uuid.UUID, vectors: RepoVectors) -> None:
+        with self._lock:
+            if vectors.nbytes > self.max_bytes:
+                self._oversized[repo_id] = vectors.version
+                return
+            self._oversized.pop(repo_id, None)
+            self._repos[repo_id] = vectors
+            self._repos.move_to_end(repo_id)
+            self.loads += 1
+            total = sum(item.nbytes for item in self._repos.values())
+            while total > self.max_bytes:
+                _, evicted = self._repos.popitem(last=False)
+                total -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "engine": settings.vector_engine,
+                "dtype": settings.vector_cache_dtype,
+                "repos": len(self._repos),
+                "bytes": sum(item.nbytes for item in self._repos.values()),
+                "max_bytes": self.max_bytes,
+                "loading": len(self._loading),
+                "oversized": len(self._oversized),
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+vector_store = VectorStore(settings.vector_cache_max_mb * 1024 * 1024)
@@ -0,0 +1,114 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import time
+import uuid
+
+from fastapi import HTTPException
+from prometheus_client import start_http_server
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import IndexJob, Repo
+from app.services.indexing import IndexProgress, index_repo
+from app.services.jobs import JobHeartbeat, claim_job, complete_job, fail_job
+from app.services.metrics import metrics_registry, trace_id_var
+from app.services.rate_limiter import embedding_rate_limiter
+
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setLevel(logging.INFO)
+    logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, HTTPException):
+        return str(exc.detail)
+    return f"{type(exc).__name__}: {exc}"
+
+
+def run_job(job_id: uuid.UUID, worker_id: str) -> None:
+    trace_id_var.set(str(job_id))
+    progress = IndexProgress()
+    with SessionLocal() as session:
+        job = session.get(IndexJob, job_id)
+        repo = session.get(Repo, job.repo_id) if job else None
+        if not job or not repo:
+            return
+        repo_id = repo.id
+
+        heartbeat = JobHeartbeat(job_id, worker_id, progress)
+        heartbeat.start()
+        try:
+            result = index_repo(session, repo, None, progress)
+        except Exception as exc:
+            session.rollback()
+            logger.exception("index_job_failed job_id=%s repo_id=%s", job_id, repo_id)
+            owned = fail_job(session, job_id, worker_id, repo_id, progress, _error_message(exc))
+        else:
+            owned = complete_job(session, job_id, worker_id, progress, result)
+        finally:
+            heartbeat.stop()
+        if not owned:
+            logger.warning(
+                "index_job_reclaimed job_id=%s worker_id=%s repo_id=%s", job_id, worker_id, repo_id
+            )
+
+
+def worker_loop(worker_id: str, stop_event) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    embedding_rate_limiter.share_between(settings.index_workers)
+    logger.info("index_worker_started worker_id=%s", worker_id)
+    while not stop_event.is_set():
+        with SessionLocal() as session:
+            job_id = claim_job(session, worker_id)
+        if job_id is None:
+            stop_event.wait(settings.job_poll_seconds)
+            continue
+        logger.info("index_job_claimed worker_id=%s job_id=%s", worker_id, job_id)
+        run_job(job_id, worker_id)
+
+
+def main() -> None:
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    processes: dict[int, multiprocessing.Process] = {}
+    host = socket.gethostname()
+    stopping = False
+
+    def handle_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+
+    if settings.worker_metrics_port:
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="metrics_"))
+        start_http_server(settings.worker_metrics_port, registry=metrics_registry())
+
+    while not stopping:
+        for slot in range(settings.index_workers):
+            process = processes.get(slot)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                logger.warning("index_worker_exited slot=%s exitcode=%s", slot, process.exitcode)
+            worker_id = f"{host}:{slot}:{uuid.uuid4().hex[:8]}"
+            process = ctx.Process(target=worker_loop, args=(worker_id, stop_event))
+            process.start()
+            processes[slot] = process
+        time.sleep(1)
+
+    stop_event.set()
+    for process in processes.values():
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
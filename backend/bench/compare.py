@@ -0,0 +1,47 @@
+import argparse
+import json
+
+
+def _flatten(value, prefix: str = "") -> dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['commit'][:12]}{' (dirty)' if baseline['dirty'] else ''}")
+    print(f"candidate {candidate['commit'][:12]}{' (dirty)' if candidate['dirty'] else ''}")
+    old = _flatten(baseline["results"])
+    new = _flatten(candidate["results"])
+    width = max((len(key) for key in old.keys() | new.keys()), default=0)
+    for key in sorted(old.keys() | new.keys()):
+        before, after = old.get(key), new.get(key)
+        if before is None or after is None:
+            change = "n/a"
+        elif before == 0:
+            change = "0.0%" if after == 0 else "new"
+        else:
+            change = f"{(after - before) / before * 100:+.1f}%"
+        print(
+            f"{key:<{width}}  {'-' if before is None else f'{before:g}':>12}  "
+            f"{'-' if after is None else f'{after:g}':>12}  {change:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_DIM = 1536
+ANSWER_WORDS = ("the", "function", "calls", "returns", "value", "from", "module")
+
+
+@dataclass
+class FakeServerConfig:
+    embedding_latency_ms: float = 50
+    chat_latency_ms: float = 300
+    jitter_ms: float = 20
+    token_delay_ms: float = 5
+    rpm_limit: int = 0
+    tpm_limit: int = 0
+    answer_words: int = 60
+    error_rate: float = 0.0
+    max_inputs: int = 0
+    seed: int = 0
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int) -> None:
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount: float) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if amount <= self.tokens:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def create_app(config: FakeServerConfig | None = None) -> FastAPI:
+    config = config or FakeServerConfig()
+    app = FastAPI(title="Fake OpenAI")
+    rng = random.Random(config.seed)
+    requests_bucket = TokenBucket(config.rpm_limit) if config.rpm_limit else None
+    tokens_bucket = TokenBucket(config.tpm_limit) if config.tpm_limit else None
+    app.state.stats = {"embeddings": 0, "chat": 0, "rate_limited": 0, "errors": 0}
+
+    def error(message: str, status_code: int, headers: dict | None = None) -> JSONResponse:
+        return JSONResponse(
+            {"error": {"message": message, "type": "fake_error", "code": None}},
+            status_code=status_code,
+            headers=headers,
+        )
+
+    def limit_headers() -> dict[str, str]:
+        headers = {}
+        for name, bucket in (("requests", requests_bucket), ("tokens", tokens_bucket)):
+            if bucket is not None:
+                headers[f"x-ratelimit-limit-{name}"] = str(bucket.capacity)
+                headers[f"x-ratelimit-remaining-{name}"] = str(max(0, int(bucket.tokens)))
+        return headers
+
+    def rate_limited(tokens: int) -> JSONResponse | None:
+        wait = 0.0
+        if requests_bucket is not None:
+            wait = requests_bucket.take(1)
+        if tokens_bucket is not None and not wait:
+            wait = tokens_bucket.take(tokens)
+        if not wait:
+            return None
+        app.state.stats["rate_limited"] += 1
+        return error("Rate limit reached", 429, {"retry-after-ms": str(int(wait * 1000) + 1)})
+
+    async def delay(latency_ms: float) -> None:
+        jitter = rng.uniform(-config.jitter_ms, config.jitter_ms)
+        await asyncio.sleep(max(0.0, latency_ms + jitter) / 1000)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        if config.max_inputs and len(inputs) > config.max_inputs:
+            return error(f"Too many inputs: at most {config.max_inputs} are allowed", 400)
+        tokens = sum(_estimate_tokens(text) for text in inputs)
+        limited = rate_limited(tokens)
+        if limited is not None:
+            return limited
+        await delay(config.embedding_latency_ms)
+        if rng.random() < config.error_rate:
+            app.state.stats["errors"] += 1
+            return error("Internal server error", 500)
+        dim = body.get("dimensions") or DEFAULT_DIM
+        base64_output = body.get("encoding_format") == "base64"
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(text, dim)
+            if base64_output:
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        app.state.stats["embeddings"] += 1
+        return JSONResponse(
+            {
+                "object": "list",
+                "data": data,
+                "model": body["model"],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+            headers=limit_headers(),
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt_tokens = sum(_estimate_tokens(m.get("content") or "") for m in body["messages"])
+        limited = rate_limited(prompt_tokens)
+        if limited is not None:
+            return limited
+        await delay(config.chat_latency_ms)
+        answer = " ".join(rng.choice(ANSWER_WORDS) for _ in range(config.answer_words))
+        content = json.dumps({"answer": answer, "citations_used": [1]})
+        completion_tokens = _estimate_tokens(content)
+        app.state.stats["chat"] += 1
+        completion_id = f"chatcmpl-{rng.getrandbits(64):x}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+
+        async def events():
+            for start in range(0, len(content), 16):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": content[start : start + 16]},
+                            "finish_reason": None,
+                        }
+                    ],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(config.token_delay_ms / 1000)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def start_fake_server(
+    port: int, config: FakeServerConfig | None = None
+) -> tuple[uvicorn.Server, threading.Thread]:
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Fake OpenAI server failed to start on port {port}")
+        time.sleep(0.05)
+    return server, thread
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--chat-latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--token-delay-ms", type=float, default=5)
+    parser.add_argument("--rpm-limit", type=int, default=0)
+    parser.add_argument("--tpm-limit", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-inputs", type=int, default=0)
+
+
+def server_config(args: argparse.Namespace) -> FakeServerConfig:
+    return FakeServerConfig(
+        embedding_latency_ms=args.embedding_latency_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        jitter_ms=args.jitter_ms,
+        token_delay_ms=args.token_delay_ms,
+        rpm_limit=args.rpm_limit,
+        tpm_limit=args.tpm_limit,
+        error_rate=args.error_rate,
+        max_inputs=args.max_inputs,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve fake OpenAI embeddings and chat.")
+    parser.add_argument("--port", type=int, default=8100)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(server_config(args)), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import os
+import random
+import subprocess
+
+WORDS = (
+    "account", "batch", "buffer", "cache", "client", "config", "context", "cursor", "digest",
+    "event", "filter", "handler", "index", "job", "ledger", "loader", "manifest", "metric",
+    "order", "parser", "payload", "queue", "record", "report", "request", "router", "schema",
+    "session", "shard", "stream", "token", "tracker", "upload", "user", "vector", "worker",
+)
+DEFAULT_MIX = "py=4,ts=2,go=1,java=1,md=1"
+
+
+def _name(rng: random.Random, parts: int = 2) -> str:
+    return "_".join(rng.choice(WORDS) for _ in range(parts))
+
+
+def _camel(rng: random.Random, parts: int = 2) -> str:
+    return "".join(word.capitalize() for word in _name(rng, parts).split("_"))
+
+
+def _statements(rng: random.Random, indent: str, count: int, terminator: str = "") -> list[str]:
+    lines = []
+    for _ in range(count):
+        target, source = _name(rng), _name(rng)
+        lines.append(f"{indent}{target} = {source} + {rng.randint(1, 999)}{terminator}")
+    return lines
+
+
+def _python(rng: random.Random, units: int) -> str:
+    lines = ['"""Synthetic module."""', "", "import os", ""]
+    for _ in range(units):
+        if rng.random() < 0.3:
+            lines += ["", f"class {_camel(rng)}:", f"    def __init__(self, {_name(rng)}):"]
+            lines += _statements(rng, "        ", rng.randint(2, 6))
+            for _ in range(rng.randint(1, 4)):
+                lines += ["", f"    def {_name(rng)}(self, value):"]
+                lines += _statements(rng, "        ", rng.randint(2, 12))
+                lines.append("        return value")
+        else:
+            lines += ["", "", f"def {_name(rng)}({_name(rng)}, {_name(rng)}=None):"]
+            lines += _statements(rng, "    ", rng.randint(2, 20))
+            lines.append("    return None")
+    return "\n".join(lines) + "\n"
+
+
+def _typescript(rng: random.Random, units: int) -> str:
+    lines = ["import { readFile } from 'fs';", ""]
+    for _ in range(units):
+        if rng.random() < 0.3:
+            lines += [f"export class {_camel(rng)} {{"]
+            for _ in range(rng.randint(1, 4)):
+                lines += [f"  {_camel(rng, 1).lower()}(value: number): number {{"]
+                lines += _statements(rng, "    const ", rng.randint(2, 10), ";")
+                lines += ["    return value;", "  }", ""]
+            lines += ["}", ""]
+        else:
+            lines += [f"export function {_camel(rng, 1).lower()}{_camel(rng)}(value: string) {{"]
+            lines += _statements(rng, "  const ", rng.randint(2, 16), ";")
+            lines += ["  return value;", "}", ""]
+    return "\n".join(lines)
+
+
+def _go(rng: random.Random, units: int) -> str:
+    lines = ["package main", "", 'import "fmt"', ""]
+    for _ in range(units):
+        lines += [f"func {_camel(rng)}(value int) int {{"]
+        lines += [f"\t{_name(rng)} := value + {rng.randint(1, 99)}" for _ in range(rng.randint(2, 16))]
+        lines += ['\tfmt.Println("done")', "\treturn value", "}", ""]
+    return "\n".join(lines)
+
+
+def _java(rng: random.Random, units: int) -> str:
+    lines = ["package bench;", "", f"public class {_camel(rng)} {{"]
+    for _ in range(units):
+        lines += [f"    public int {_camel(rng, 1).lower()}{_camel(rng)}(int value) {{"]
+        lines += _statements(rng, "        int ", rng.randint(2, 14), ";")
+        lines += ["        return value;", "    }", ""]
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _markdown(rng: random.Random, units: int) -> str:
+    lines = [f"# {_camel(rng)}", ""]
+    for _ in range(units):
+        lines += [f"## {_camel(rng)}", ""]
+        lines += [" ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))), ""]
+    return "\n".join(lines)
+
+
+GENERATORS = {"py": _python, "ts": _typescript, "go": _go, "java": _java, "md": _markdown}
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        ext, _, weight = item.partition("=")
+        if ext.strip() not in GENERATORS:
+            raise ValueError(f"Unknown language in mix: {ext}")
+        weights[ext.strip()] = int(weight or 1)
+    return weights
+
+
+def generate_repo(
+    path: str,
+    files: int = 200,
+    mix: str = DEFAULT_MIX,
+    min_units: int = 3,
+    max_units: int = 30,
+    asset_mb: int = 0,
+    seed: int = 0,
+) -> str:
+    rng = random.Random(seed)
+    weights = parse_mix(mix)
+    exts = list(weights)
+    os.makedirs(path, exist_ok=True)
+    for i in range(files):
+        ext = rng.choices(exts, weights=[weights[ext] for ext in exts])[0]
+        directory = os.path.join(path, f"pkg{i % 17}", f"mod{i % 5}")
+        os.makedirs(directory, exist_ok=True)
+        content = GENERATORS[ext](rng, rng.randint(min_units, max_units))
+        with open(os.path.join(directory, f"{_name(rng)}_{i}.{ext}"), "w") as f:
+            f.write(content)
+    if asset_mb:
+        os.makedirs(os.path.join(path, "assets"), exist_ok=True)
+        with open(os.path.join(path, "assets", "blob.bin"), "wb") as f:
+            f.write(rng.randbytes(asset_mb * 1024 * 1024))
+
+    git = ["git", "-C", path, "-c", "user.name=bench", "-c", "user.email=bench@example.com"]
+    subprocess.run([*git, "init", "-q"], check=True)
+    subprocess.run([*git, "config", "uploadpack.allowFilter", "true"], check=True)
+    subprocess.run([*git, "add", "-A"], check=True)
+    subprocess.run([*git, "commit", "-q", "-m", "synthetic repo"], check=True)
+    return f"file://{os.path.abspath(path)}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic git repo.")
+    parser.add_argument("path")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--min-units", type=int, default=3)
+    parser.add_argument("--max-units", type=int, default=30)
+    parser.add_argument("--asset-mb", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(
+        generate_repo(
+            args.path,
+            args.files,
+            args.mix,
+            args.min_units,
+            args.max_units,
+            args.asset_mb,
+            args.seed,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
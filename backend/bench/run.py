@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import SessionLocal
+from app.main import app
+from app.models import Repo
+from app.services.indexing import _chunk_content, _iter_files, index_repo
+from app.services.metrics import STAGE_SECONDS
+from app.services.partitions import partition_name
+from app.services.rate_limiter import embedding_rate_limiter
+from bench.fake_openai import add_server_arguments, server_config, start_fake_server
+from bench.repo_gen import DEFAULT_MIX, WORDS, generate_repo
+
+SCENARIOS = ("chunker", "index", "chat")
+RECORDED_SETTINGS = (
+    "embedding_model",
+    "embedding_dim",
+    "embedding_storage",
+    "embedding_batch_size",
+    "embedding_concurrency",
+    "ingest_mode",
+    "chunk_workers",
+    "chunk_write_mode",
+    "vector_index_type",
+    "vector_index_quantization",
+    "vector_engine",
+    "retrieval_mode",
+    "retrieval_top_k",
+    "context_token_budget",
+)
+
+
+def _git(*args: str) -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(["git", "-C", root, *args], capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _latency_summary(values: list[float]) -> dict:
+    if not values:
+        return {}
+    return {
+        "p50_ms": round(_percentile(values, 50) * 1000, 2),
+        "p90_ms": round(_percentile(values, 90) * 1000, 2),
+        "p99_ms": round(_percentile(values, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+def _stage_totals() -> dict[str, dict[str, float]]:
+    totals: dict[str, dict[str, float]] = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            stage = totals.setdefault(sample.labels["stage"], {"seconds": 0.0, "count": 0.0})
+            if sample.name.endswith("_sum"):
+                stage["seconds"] = sample.value
+            elif sample.name.endswith("_count"):
+                stage["count"] = sample.value
+    return totals
+
+
+def _stage_delta(before: dict, after: dict) -> dict:
+    delta = {}
+    for stage, values in after.items():
+        previous = before.get(stage, {"seconds": 0.0, "count": 0.0})
+        count = values["count"] - previous["count"]
+        if count:
+            delta[stage] = {
+                "seconds": round(values["seconds"] - previous["seconds"], 4),
+                "count": int(count),
+            }
+    return delta
+
+
+def run_chunker(repo_path: str, repeat: int) -> dict:
+    files = []
+    for rel_path in _iter_files(repo_path):
+        with open(os.path.join(repo_path, rel_path), "r", encoding="utf-8", errors="ignore") as f:
+            files.append((rel_path, f.read()))
+    total_bytes = sum(len(content.encode("utf-8")) for _, content in files)
+
+    timings = []
+    chunks = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = sum(len(_chunk_content(content, path, True)[1]) for path, content in files)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "files": len(files),
+        "bytes": total_bytes,
+        "chunks": chunks,
+        "seconds": round(best, 4),
+        "files_per_second": round(len(files) / best, 1),
+        "mb_per_second": round(total_bytes / best / 1e6, 2),
+    }
+
+
+def run_index(repo_url: str) -> tuple[dict, uuid.UUID]:
+    settings.embedding_cache_enabled = False
+    with SessionLocal() as session:
+        repo = Repo(name="bench", github_url=repo_url)
+        session.add(repo)
+        session.commit()
+        before = _stage_totals()
+        start = time.perf_counter()
+        result = index_repo(session, repo, None)
+        seconds = time.perf_counter() - start
+        return {
+            "seconds": round(seconds, 3),
+            "files": result.files_indexed,
+            "chunks": result.chunks_indexed,
+            "files_per_second": round(result.files_indexed / seconds, 1),
+            "chunks_per_second": round(result.chunks_indexed / seconds, 1),
+            "stages": _stage_delta(before, _stage_totals()),
+            "embedding_limiter": embedding_rate_limiter.stats(),
+        }, repo.id
+
+
+def _questions(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        f"How does {rng.choice(WORDS)}_{rng.choice(WORDS)} use the {rng.choice(WORDS)}?"
+        for _ in range(count)
+    ]
+
+
+async def _chat_request(client: httpx.AsyncClient, repo_id: uuid.UUID, question: str, stream):
+    start = time.perf_counter()
+    first_token = None
+    if not stream:
+        response = await client.post(f"/repos/{repo_id}/chat", json={"question": question})
+        return response.status_code == 200, time.perf_counter() - start, None
+
+    async with client.stream(
+        "POST", f"/repos/{repo_id}/chat/stream", json={"question": question}
+    ) as response:
+        ok = response.status_code == 200
+        async for line in response.aiter_lines():
+            if line == "event: token" and first_token is None:
+                first_token = time.perf_counter() - start
+            elif line == "event: error":
+                ok = False
+    return ok, time.perf_counter() - start, first_token
+
+
+async def _run_chat(repo_id: uuid.UUID, args: argparse.Namespace) -> dict:
+    questions = _questions(args.requests + args.warmup, args.seed)
+    warmup, questions = questions[args.requests :], questions[: args.requests]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    first_tokens: list[float] = []
+    errors = 0
+
+    async def one(client: httpx.AsyncClient, question: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            try:
+                ok, seconds, first_token = await _chat_request(
+                    client, repo_id, question, args.stream
+                )
+            except httpx.HTTPError:
+                ok, seconds, first_token = False, 0.0, None
+        if not ok:
+            errors += 1
+            return
+        latencies.append(seconds)
+        if first_token is not None:
+            first_tokens.append(first_token)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=settings.openai_timeout_seconds
+    ) as client:
+        for question in warmup:
+            await one(client, question)
+        latencies.clear()
+        first_tokens.clear()
+        errors = 0
+        before = _stage_totals()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, question) for question in questions))
+        seconds = time.perf_counter() - start
+
+    summary = {
+        "requests": len(questions),
+        "concurrency": args.concurrency,
+        "stream": args.stream,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(latencies) / seconds, 2),
+        "latency": _latency_summary(latencies),
+        "stages": _stage_delta(before, _stage_totals()),
+    }
+    if first_tokens:
+        summary["first_token"] = _latency_summary(first_tokens)
+    return summary
+
+
+def _delete_repo(repo_id: uuid.UUID) -> None:
+    with SessionLocal() as session:
+        session.execute(text(f"DROP TABLE IF EXISTS {partition_name(repo_id)}"))
+        for table in ("chunk_symbols", "repo_files", "index_jobs", "repos"):
+            column = "id" if table == "repos" else "repo_id"
+            session.execute(text(f"DELETE FROM {table} WHERE {column} = :id"), {"id": repo_id})
+        session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run indexing and chat benchmarks.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunker-repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--keep-repo", action="store_true")
+    parser.add_argument("--output", default=None)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    settings.openai_base_url = f"http://127.0.0.1:{args.port}/v1"
+    settings.openai_api_key = settings.openai_api_key or "bench"
+    server, _ = start_fake_server(args.port, server_config(args))
+
+    results: dict[str, dict] = {}
+    repo_id = None
+    with tempfile.TemporaryDirectory(prefix="bench_repo_") as repo_path:
+        repo_url = generate_repo(repo_path, args.files, args.mix, seed=args.seed)
+        try:
+            if "chunker" in scenarios:
+                results["chunker"] = run_chunker(repo_path, args.chunker_repeat)
+            if "index" in scenarios or "chat" in scenarios:
+                index_result, repo_id = run_index(repo_url)
+                if "index" in scenarios:
+                    results["index"] = index_result
+            if "chat" in scenarios:
+                results["chat"] = asyncio.run(_run_chat(repo_id, args))
+        finally:
+            if repo_id is not None and not args.keep_repo:
+                _delete_repo(repo_id)
+            server.should_exit = True
+
+    report = {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count()},
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "settings": {name: getattr(settings, name) for name in RECORDED_SETTINGS},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
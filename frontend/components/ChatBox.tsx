@@ -1,7 +1,7 @@
 "use client";
 
 import { useState } from "react";
-import { chat } from "../lib/api";
+import { chatStream } from "../lib/api";
 import { ChatMessage, RepoInfo } from "../lib/types";
 import SourceList from "./SourceList";
 
@@ -25,19 +25,33 @@ export default function ChatBox({ repo }: { repo: RepoInfo }) {
     setLoading(true);
     setQuestion("");
 
-    setMessages((prev) => [...prev, { role: "user", content: trimmed }]);
+    setMessages((prev) => [
+      ...prev,
+      { role: "user", content: trimmed },
+      { role: "assistant", content: "" }
+    ]);
+
+    const updateAssistant = (update: (msg: ChatMessage) => ChatMessage) =>
+      setMessages((prev) => {
+        const next = [...prev];
+        next[next.length - 1] = update(next[next.length - 1]);
+        return next;
+      });
 
     try {
-      const res = await chat(repo.repo_id, trimmed);
-      setMessages((prev) => [
-        ...prev,
-        {
-          role: "assistant",
-          content: normalizeAnswer(res.answer),
-          sources: res.sources
-        }
-      ]);
+      const res = await chatStream(repo.repo_id, trimmed, {
+        onToken: (text) => updateAssistant((msg) => ({ ...msg, content: msg.content + text }))
+      });
+      updateAssistant((msg) => ({
+        ...msg,
+        content: normalizeAnswer(res.answer),
+        sources: res.sources
+      }));
     } catch (err) {
+      setMessages((prev) => {
+        const last = prev[prev.length - 1];
+        return last?.role === "assistant" && !last.content ? prev.slice(0, -1) : prev;
+      });
       setError(err instanceof Error ? err.message : "Request failed");
     } finally {
       setLoading(false);
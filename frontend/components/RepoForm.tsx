@@ -2,10 +2,16 @@
 
 import { useEffect, useState } from "react";
 import Link from "next/link";
-import { createRepo, indexRepo, listRepos } from "../lib/api";
+import { createRepo, getIndexStatus, indexRepo, listRepos } from "../lib/api";
 import { getRepos, saveRepo, saveRepos } from "../lib/storage";
 import { isValidGithubRepoUrl } from "../lib/validate";
-import { RepoInfo } from "../lib/types";
+import { IndexStatus, RepoInfo } from "../lib/types";
+
+const POLL_INTERVAL_MS = 2000;
+
+function sleep(ms: number) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
 
 export default function RepoForm() {
   const [name, setName] = useState("");
@@ -65,7 +71,14 @@ export default function RepoForm() {
     const next = { ...target, status: "processing" as const };
     updateRepo(next);
     try {
-      await indexRepo(target.repo_id);
+      let job: IndexStatus = await indexRepo(target.repo_id);
+      while (job.status === "queued" || job.status === "running") {
+        await sleep(POLL_INTERVAL_MS);
+        job = await getIndexStatus(target.repo_id);
+      }
+      if (job.status !== "done") {
+        throw new Error(job.error || "Indexing failed");
+      }
       const done = { ...target, status: "done" as const };
       updateRepo(done);
     } catch (err) {
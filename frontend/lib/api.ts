@@ -1,4 +1,4 @@
-import { ChatResponse, IndexResult, RepoInfo } from "./types";
+import { ChatResponse, ChatSource, IndexStatus, RepoInfo } from "./types";
 
 const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || "";
 
@@ -35,12 +35,20 @@ export async function listRepos(): Promise<RepoInfo[]> {
   return handleResponse<RepoInfo[]>(res);
 }
 
-export async function indexRepo(repoId: string): Promise<IndexResult> {
+export async function indexRepo(repoId: string): Promise<IndexStatus> {
   const base = requireBaseUrl();
   const res = await fetch(`${base}/repos/${encodeURIComponent(repoId)}/index`, {
     method: "POST"
   });
-  return handleResponse<IndexResult>(res);
+  return handleResponse<IndexStatus>(res);
+}
+
+export async function getIndexStatus(repoId: string): Promise<IndexStatus> {
+  const base = requireBaseUrl();
+  const res = await fetch(`${base}/repos/${encodeURIComponent(repoId)}/index/status`, {
+    method: "GET"
+  });
+  return handleResponse<IndexStatus>(res);
 }
 
 export async function chat(repoId: string, question: string): Promise<ChatResponse> {
@@ -52,3 +60,60 @@ export async function chat(repoId: string, question: string): Promise<ChatRespon
   });
   return handleResponse<ChatResponse>(res);
 }
+
+export type ChatStreamHandlers = {
+  onSources?: (sources: ChatSource[]) => void;
+  onToken?: (text: string) => void;
+};
+
+export async function chatStream(
+  repoId: string,
+  question: string,
+  handlers: ChatStreamHandlers = {}
+): Promise<ChatResponse> {
+  const base = requireBaseUrl();
+  const res = await fetch(`${base}/repos/${encodeURIComponent(repoId)}/chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({ question })
+  });
+  if (!res.ok || !res.body) {
+    const text = await res.text();
+    throw new Error(text || `Request failed: ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result: ChatResponse | null = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary >= 0) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : {};
+      if (event === "sources") handlers.onSources?.(payload.sources || []);
+      else if (event === "token") handlers.onToken?.(payload.text || "");
+      else if (event === "done") result = payload as ChatResponse;
+      else if (event === "error") throw new Error(payload.detail || "Request failed");
+    }
+  }
+
+  if (!result) {
+    throw new Error("Stream ended before the answer was complete");
+  }
+  return result;
+}
@@ -2,15 +2,20 @@ export type RepoInfo = {
   repo_id: string;
   name?: string | null;
   github_url: string;
-  status: "not_indexed" | "processing" | "done" | string;
+  status: "not_indexed" | "queued" | "processing" | "done" | "failed" | string;
 };
 
-export type IndexResult = {
-  files_indexed?: number;
-  chunks_indexed?: number;
-  files?: number;
-  chunks?: number;
-  [key: string]: unknown;
+export type IndexStatus = {
+  repo_id: string;
+  repo_status: string;
+  job_id?: string | null;
+  status?: "queued" | "running" | "done" | "failed" | null;
+  stage?: string | null;
+  files_total: number;
+  files_processed: number;
+  chunks_processed: number;
+  error?: string | null;
+  eta_seconds?: number | null;
 };
 
 export type ChatSource = {